@@ -29,6 +29,14 @@ import tensorflow as tf  # noqa: F401
 import tensorflow_hub as hub
 import tensorflow_text  # IMPORTANT: registers custom ops like SentencepieceOp before loading TF-Hub models
 
+from src.embedding_cache import EmbeddingCache
+from src.inference import BackgroundLoader
+from src.encoder_store import resolve as resolve_encoder
+from src.prediction_log import PredictionLogWriter
+from src.audit_store import AuditStore
+from src.direct_features import direct_predictor
+from src.xgb_export import LeanXGBPredictor
+
 # ---------------------------
 # Page setup
 # ---------------------------
@@ -88,9 +96,11 @@ APP_VERSION = "3.2.0"
 MODEL_PATH = "model/xgb_model_calibrated.pkl"
 EMBEDDER_URL = "https://tfhub.dev/google/universal-sentence-encoder-multilingual-large/3"
 EXPLAINER_PATH = "model/xgb_explainer.pkl"  # optional
+LEAN_MODEL_PATH = "model/xgb_lean.joblib"  # optional, from: python -m src.xgb_export
 
 NUM_COLS = ['age','sbp','dbp','temp','pr','rr','o2sat','gcs_e','gcs_v','gcs_m','sex','how_come_er','t_n']
 TEXT_COLS = [f'text_{i}' for i in range(512)]  # we generate 512-dim USE then your pipeline may PCA
+CAT_COLS = ['sex','how_come_er','t_n']
 
 # i18n strings
 LANGS = {
@@ -107,7 +117,7 @@ LANGS = {
     'triage':'Triage level','zone':'Suggested zone','actions':'Suggested actions now','why':'Why',
     'outcomes':'Outcome probability','download':'Download result (CSV)',
     'cutoffs':'Triage cutoffs','cut_l1':'Level 1: Critical risk ≥','cut_l2':'Level 2: Critical risk ≥','cut_l3':'Level 3: Urgent resource risk ≥','cut_l4':'Level 4: Minor resource risk ≥',
-    'redflags_toggle':'Apply vital‑sign red‑flags (auto Level 1)','redflags':'Red‑flag thresholds','save_log':'Save prediction to CSV log',
+    'redflags_toggle':'Apply vital‑sign red‑flags (auto Level 1)','redflags':'Red‑flag thresholds','save_log':'Save prediction log',
     'advanced':'Advanced (paths)','footer_note':'Decision support only. Follow local protocols and clinical judgment.',
     'footer_evidence':'Evidence: internal validation (2018–2022) with bootstrapping, calibration, and strong AUROC; see preprint:',
     'footer_team':'Team: Patipan Sitthiprawiat, Borwon Wittayachamnankul, Wachiranun Sirikul, Korsin Laohavisudhi — Chiang Mai University Faculty of Medicine (Emergency Medicine & Informatics)',
@@ -128,7 +138,7 @@ LANGS = {
     'triage':'ระดับคัดแยก','zone':'โซนที่แนะนำ','actions':'การดำเนินการทันที','why':'เหตุผล',
     'outcomes':'ความน่าจะเป็นของผลลัพธ์','download':'ดาวน์โหลดผลลัพธ์ (CSV)',
     'cutoffs':'ค่าตัดสินใจของระดับคัดแยก','cut_l1':'ระดับ 1: ความเสี่ยงวิกฤต ≥','cut_l2':'ระดับ 2: ความเสี่ยงวิกฤต ≥','cut_l3':'ระดับ 3: ความเสี่ยงทรัพยากรเร่งด่วน ≥','cut_l4':'ระดับ 4: ความเสี่ยงทรัพยากรเล็กน้อย ≥',
-    'redflags_toggle':'เปิดใช้สัญญาณเตือนชีพ (ปรับเป็นระดับ 1 อัตโนมัติ)','redflags':'เกณฑ์สัญญาณเตือนชีพ','save_log':'บันทึกผลลง CSV',
+    'redflags_toggle':'เปิดใช้สัญญาณเตือนชีพ (ปรับเป็นระดับ 1 อัตโนมัติ)','redflags':'เกณฑ์สัญญาณเตือนชีพ','save_log':'บันทึกผลการประเมิน',
     'advanced':'ขั้นสูง (ตำแหน่งไฟล์)','footer_note':'เป็นเครื่องมือช่วยตัดสินใจ ไม่ทดแทนวิจารณญาณทางคลินิก โปรดปฏิบัติตามแนวทางของหน่วยงาน',
     'footer_evidence':'หลักฐาน: ตรวจสอบภายในพร้อม bootstrap และการสอบเทียบ ค่า AUROC ดีมาก ดู preprint:',
     'footer_team':'ทีม: นพ.ปฏิภาณ สิทธิประเวศ, รศ.นพ.บรวน วิทยาชำนะกุล, ผศ.ดร.วชิรนันท์ ศิริกุล, รศ.นพ.กรศิณ ล้อวิศษฎ์ — คณะแพทยศาสตร์ มช. (ฉุกเฉิน & อินฟอร์แมติกส์)',
@@ -157,38 +167,91 @@ ZONE_MAP = {
 # ---------------------------
 # Loaders (cached)
 # ---------------------------
-@st.cache_resource(show_spinner=False)
-def load_model(model_path: str):
-    with open(model_path, 'rb') as f:
+def _read_pickle(path: str):
+    with open(path, 'rb') as f:
         return pickle.load(f)
 
-@st.cache_resource(show_spinner=False)
-def load_embedder(url: str):
+def _read_optional_pickle(path: str):
+    return _read_pickle(path) if os.path.exists(path) else None
+
+def _read_optional_lean(path: str):
+    # The lean export is only an accelerator: a missing, corrupt or incompatible file falls back to the pickle
+    if not os.path.exists(path):
+        return None
     try:
-        # tensorflow_text import above ensures custom ops are registered
-        return hub.load(url)
+        return LeanXGBPredictor.load(path)
     except Exception as e:
-        st.error("Failed to load text embedder. Ensure TensorFlow Text matches your TF version (e.g., tensorflow==2.12.* with tensorflow-text==2.12.*)." 
-                 f"Details: {type(e).__name__}: {e}")
-        raise
+        print(f"Lean XGBoost predictor disabled: {type(e).__name__}: {e}")
+        return None
+
+def _build_input_df(values: list, use_vec: np.ndarray) -> pd.DataFrame:
+    # NUM_COLS + TEXT_COLS frame the sklearn pipeline was fitted on (fallback path and parity checks)
+    return pd.concat([pd.DataFrame([values], columns=NUM_COLS), pd.DataFrame(use_vec.reshape(1, -1), columns=TEXT_COLS)], axis=1)
+
+def _warm_up(artifacts: dict):
+    # One synthetic patient through the encoder and the calibrated pipeline so the first real one pays no tracing cost.
+    # The direct feature path is resolved here and only kept if it reproduces predict_proba on the same patients.
+    use_vecs = np.asarray(artifacts['embedder'](["chest pain", "ไข้ ไอ"]), dtype=np.float32)
+    sample = pd.concat([
+        _build_input_df([40, 110, 70, 37.4, 98, 22, 95, 4, 5, 6, 'ช', 'EMS', 'N'], use_vecs[0]),
+        _build_input_df([75, 85, 50, 38.9, 124, 30, 88, 3, 4, 5, 'ญ', 'Walkin', 'N'], use_vecs[1]),
+    ], ignore_index=True)
+    artifacts['model'].predict_proba(sample)
+    artifacts['direct'] = direct_predictor(artifacts['model'], NUM_COLS, TEXT_COLS, CAT_COLS, sample=sample)
+    if artifacts['lean'] is not None:
+        # An export from another model version must not silently change predictions
+        try:
+            artifacts['lean'].verify(artifacts['model'], sample)
+        except Exception as e:
+            print(f"Lean XGBoost predictor disabled: {type(e).__name__}: {e}")
+            artifacts['lean'] = None
 
 @st.cache_resource(show_spinner=False)
-def load_explainer(path: str):
-    if not os.path.exists(path):
-        return None
-    with open(path, 'rb') as f:
-        return pickle.load(f)
+def start_loading() -> BackgroundLoader:
+    # Model, embedder and explainer load concurrently in background threads while the form renders
+    # (tensorflow_text import above ensures custom ops are registered for the embedder)
+    return BackgroundLoader({
+        'model': lambda: _read_pickle(MODEL_PATH),
+        'embedder': lambda: hub.load(resolve_encoder(EMBEDDER_URL)),  # local store first, network otherwise
+        'explainer': lambda: _read_optional_pickle(EXPLAINER_PATH),
+        'lean': lambda: _read_optional_lean(LEAN_MODEL_PATH),
+    }, warm_up=_warm_up)
 
-# Load artifacts once
-MODEL = load_model(MODEL_PATH)
-EMBEDDER = load_embedder(EMBEDDER_URL)
-EXPLAINER = load_explainer(EXPLAINER_PATH)
+@st.cache_resource(show_spinner=False)
+def load_embedding_cache(url: str) -> EmbeddingCache:
+    # One disk-backed cache per embedder URL, shared by all sessions in this process
+    return EmbeddingCache(url)
+
+@st.cache_resource(show_spinner=False)
+def load_audit_store() -> AuditStore:
+    # Indexed SQLite copy of the prediction log for audit queries
+    return AuditStore()
 
-# Try to detect PCA n_components from pipeline (optional)
-try:
-    _n_comp = MODEL.get_params().get('preprocessing__col__text__pca__n_components', None)
-except Exception:
-    _n_comp = None
+@st.cache_resource(show_spinner=False)
+def load_log_writer() -> PredictionLogWriter:
+    # One background Parquet writer per process; write_log only enqueues.
+    # Each flushed batch is also inserted into the audit store from the writer thread.
+    writer = PredictionLogWriter("logs")
+    writer.sinks.append(load_audit_store().insert_many)
+    return writer
+
+# Start loading artifacts once; MODEL / LEAN / DIRECT / EMBEDDER / EXPLAINER are bound by use_artifacts()
+LOADER = start_loading()
+EMBEDDING_CACHE = load_embedding_cache(EMBEDDER_URL)
+MODEL = LEAN = DIRECT = EMBEDDER = EXPLAINER = None
+_n_comp = None
+
+def use_artifacts():
+    """Block until background loading and warm-up finished, then bind the loaded artifacts."""
+    global MODEL, LEAN, DIRECT, EMBEDDER, EXPLAINER, _n_comp
+    artifacts = LOADER.wait()
+    MODEL, EMBEDDER, EXPLAINER = artifacts['model'], artifacts['embedder'], artifacts['explainer']
+    LEAN, DIRECT = artifacts.get('lean'), artifacts.get('direct')
+    # Try to detect PCA n_components from pipeline (optional)
+    try:
+        _n_comp = MODEL.get_params().get('preprocessing__col__text__pca__n_components', None)
+    except Exception:
+        _n_comp = None
 
 # ---------------------------
 # Sidebar — language, cutoffs, red‑flags
@@ -226,8 +289,8 @@ with st.sidebar:
 # ---------------------------
 
 def embed_text(text: str) -> np.ndarray:
-    # Returns 512-dim USE vector
-    return np.array(EMBEDDER([str(text)])).reshape(1, -1)
+    # Returns 512-dim USE vector; repeat complaints come from the embedding cache
+    return EMBEDDING_CACHE.embed([text], EMBEDDER).reshape(1, -1)
 
 
 def vital_red_flags(v: dict) -> list[str]:
@@ -298,9 +361,16 @@ def actions_for_level(level: int) -> list[str]:
         return ["Assign to **White zone** (Fast‑track/clinic)", "Safety‑net instructions and follow‑up advice"]
 
 
-def predict_single(input_df: pd.DataFrame) -> float:
-    # Your trained sklearn pipeline expects NUM_COLS + TEXT_COLS; we provide both.
-    proba = MODEL.predict_proba(input_df)
+def predict_single(values: list, use_vec: np.ndarray) -> float:
+    # values in NUM_COLS order + the 512-d embedding. LEAN (exported booster + PCA + calibration lookup)
+    # is fastest; DIRECT fills preallocated arrays in the pipeline's column order; otherwise the
+    # NUM_COLS + TEXT_COLS DataFrame goes through predict_proba.
+    if LEAN is not None:
+        proba = LEAN.predict_proba(values, use_vec)
+    elif DIRECT is not None:
+        proba = DIRECT.predict_proba(values, use_vec)
+    else:
+        proba = MODEL.predict_proba(_build_input_df(values, use_vec))
     # Binary classifier: [p(class0), p(class1)] ⇒ ICU probability is [:,1]
     return float(proba[0][1])
 
@@ -308,7 +378,6 @@ def predict_single(input_df: pd.DataFrame) -> float:
 def write_log(single_input: dict, icu_prob: float, level: int):
     if not log_predictions:
         return
-    os.makedirs("logs", exist_ok=True)
     row = {
         "timestamp": datetime.now().isoformat(timespec='seconds'),
         "session": st.session_state.get('session_id'),
@@ -316,8 +385,8 @@ def write_log(single_input: dict, icu_prob: float, level: int):
         "pred_icu": icu_prob,
         "triage_level": level,
     }
-    path = os.path.join("logs", "predictions.csv")
-    pd.DataFrame([row]).to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    # Batched into logs/predictions-*.parquet by a background thread
+    load_log_writer().write(row)
 
 # Stable session id
 if 'session_id' not in st.session_state:
@@ -358,28 +427,45 @@ with left:
 
         submitted = st.form_submit_button(T['predict'], use_container_width=True)
 
-    input_df = None
-    if submitted:
+    input_values = None
+    loaded = False
+    if submitted and LOADER.status != 'failed':
+        with st.spinner("Model warming up..." if LANG_KEY=='en' else "กำลังเตรียมโมเดล..."):
+            try:
+                use_artifacts()
+                loaded = True
+            except Exception:
+                # Loading failed while this submit waited; LOADER.status is now 'failed', so the
+                # recommendation column below shows the same load-failed message (and retries next rerun)
+                pass
+
+    if loaded:
         # Map back to raw expected tokens for model
         gender_raw = gender if LANG_KEY=='th' else ('ญ' if gender=='F' else 'ช')
         arrival_raw = {'Walk-in':'Walkin','EMS':'EMS','Referral':'Referral',
                        'เดินมาเอง':'Walkin','EMS':'EMS','ส่งต่อ':'Referral'}[arrival]
         case_raw = {'Trauma':'T','Non-trauma':'N','อุบัติเหตุ':'T','ไม่ใช่อุบัติเหตุ':'N'}[case_type]
 
-        # Build data frame with numeric/cat + 512-d text embedding
+        # Numeric/cat values in NUM_COLS order + 512-d text embedding (no per-request DataFrame)
         use_vec = embed_text(cc)
-        text_df = pd.DataFrame(use_vec, columns=TEXT_COLS)
-
-        num_df = pd.DataFrame([[age, sbp, dbp, temp, pr, rr, o2sat, gcs_e, gcs_v, gcs_m, gender_raw, arrival_raw, case_raw]],
-                              columns=NUM_COLS)
-        input_df = pd.concat([num_df, text_df], axis=1)
+        input_values = [age, sbp, dbp, temp, pr, rr, o2sat, gcs_e, gcs_v, gcs_m, gender_raw, arrival_raw, case_raw]
+        single_input = dict(zip(NUM_COLS, input_values)) | {"cc": cc}
 
 with right:
     st.subheader(T['recommendation'])
-    if submitted and input_df is not None:
+    if LOADER.status == 'loading':
+        st.info("Model warming up — you can start filling in the form; the recommendation appears as soon as it is ready."
+                if LANG_KEY=='en' else "กำลังเตรียมโมเดล — เริ่มกรอกข้อมูลได้เลย ระบบจะแสดงคำแนะนำเมื่อโมเดลพร้อม")
+    elif LOADER.status == 'failed':
+        st.error("Failed to load model or text embedder. Ensure TensorFlow Text matches your TF version (e.g., tensorflow==2.12.* with tensorflow-text==2.12.*). "
+                 f"Details: {type(LOADER.error).__name__}: {LOADER.error}")
+        # Retry the load on the next rerun instead of caching the failure
+        start_loading.clear()
+
+    if submitted and input_values is not None:
         with st.spinner("Analyzing..." if LANG_KEY=='en' else "กำลังประมวลผล..."):
             try:
-                icu_prob = predict_single(input_df)
+                icu_prob = predict_single(input_values, use_vec)
                 vitals = dict(sbp=sbp, o2sat=o2sat, rr=rr, temp=temp, gcs_e=gcs_e, gcs_v=gcs_v, gcs_m=gcs_m)
                 level, css, why = triage_decision(icu_prob, vitals)
                 lvl_name = LEVEL_MAP[level][0][LANG_KEY]
@@ -402,7 +488,7 @@ with right:
                     st.progress(min(max(icu_prob, 0.0), 1.0))
 
                 # Download result
-                out_row = {**input_df.iloc[0].to_dict(), "pred_icu": icu_prob, "triage_level": level, "zone": zone_name}
+                out_row = {**single_input, "pred_icu": icu_prob, "triage_level": level, "zone": zone_name}
                 out_df = pd.DataFrame([out_row])
                 st.download_button(
                     T['download'],
@@ -413,7 +499,7 @@ with right:
                 )
 
                 if log_predictions:
-                    write_log(num_df.iloc[0].to_dict() | {"cc": cc}, icu_prob, level)
+                    write_log(single_input, icu_prob, level)
 
             except Exception as e:
                 st.error(("Prediction failed: " if LANG_KEY=='en' else "ไม่สามารถประมวลผลได้: ") + f"{type(e).__name__}: {e}")
@@ -13,6 +13,8 @@
 # Disclaimer: Decision support only. Follow local protocols and clinical judgment.
 
 from __future__ import annotations
+import hashlib
+import io
 import os
 import time
 import uuid
@@ -21,15 +23,14 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 import streamlit as st
-import joblib
 
-# Heavy deps
-import tensorflow as tf  # noqa: F401
-import tensorflow_hub as hub
-import tensorflow_text  # Registers custom ops (e.g., SentencepieceOp) for TF‑Hub multilingual models
-
-# Project internals
-from src.source import DataPreprocessing, TriageModel
+# Project internals (the pipeline pulls in TensorFlow, TF‑Hub and TF‑Text)
+from src.inference import TriagePipeline, MicroBatcher, DEFAULT_PATHS, DEFAULT_EMBEDDER_URL
+from src.triage import TARGETS, NUM_COLS, TEXT_COLS, VITAL_COLS, triage_level, triage_levels, vital_red_flags
+from src.prediction_log import PredictionLogWriter, log_signature, read_prediction_logs
+from src.audit_store import AuditStore
+from src.metrics import METRICS, start_metrics_server
+from src.cutoff_simulator import cutoff_grid, simulate
 
 # # Set Kaggle credentials from secrets
 # os.environ['KAGGLE_USERNAME'] = st.secrets["kaggle"]["username"]
@@ -94,19 +95,9 @@ st.markdown(
 # ---------------------------
 APP_VERSION = "3.0.0"
 
-DEFAULT_PATHS = {
-    "num_preprocessor": "model/num_preprocessor.joblib",
-    "keras_model": "model/model.keras",
-    "keras_weights": "model/weights.weights.h5",
-}
-
-TARGETS = [
-    "icu_admission", "or", "7_day_death", "admission", "lab",
-    "xray", "et", "inject", "consult"
-]
-
-NUM_COLS = ['age','sbp','dbp','temp','pr','rr','o2sat','gcs_e','gcs_v','gcs_m','sex','how_come_er','t_n']
-TEXT_COLS = ['cc']
+# Concurrent single-patient submits from all sessions are coalesced into one forward pass
+MICRO_BATCH_SIZE = 32
+MICRO_BATCH_WAIT_MS = 5.0
 
 # i18n strings
 LANGS = {
@@ -123,8 +114,8 @@ LANGS = {
     'triage':'Triage level','zone':'Suggested zone','actions':'Suggested actions now','why':'Why',
     'outcomes':'Outcome probabilities','download':'Download result (CSV)',
     'cutoffs':'Triage cutoffs','cut_l1':'Level 1: Critical risk ≥','cut_l2':'Level 2: Critical risk ≥','cut_l3':'Level 3: Urgent resource risk ≥','cut_l4':'Level 4: Minor resource risk ≥',
-    'redflags_toggle':'Apply vital‑sign red‑flags (auto Level 1)','redflags':'Red‑flag thresholds','save_log':'Save prediction to CSV log',
-    'advanced':'Advanced (model paths)','num_preproc':'Numeric preprocessor','keras_model':'Keras model','keras_weights':'Keras weights (optional)','embedder':'Text embedder (TF‑Hub)',
+    'redflags_toggle':'Apply vital‑sign red‑flags (auto Level 1)','redflags':'Red‑flag thresholds','save_log':'Save prediction log',
+    'advanced':'Advanced (model paths)','num_preproc':'Numeric preprocessor','keras_model':'Keras model','keras_weights':'Keras weights (optional)','calibration':'Calibration tables (optional)','embedder':'Text embedder (TF‑Hub)',
     'footer_note':'This tool provides guidance only and does not replace clinical judgment. Follow local protocols.',
     'footer_evidence':'Evidence: internal validation on 163,452 ED visits (2018–2022) at a Thai tertiary center. XGBoost AUROC 0.917; AUPRC 0.629; bootstrapped calibration/stability. Preprint:',
     'footer_team':'Team: Patipan Sitthiprawiat, Borwon Wittayachamnankul, Wachiranun Sirikul, Korsin Laohavisudhi — Chiang Mai University Faculty of Medicine (Emergency Medicine Department & Informatics)',
@@ -139,6 +130,8 @@ LANGS = {
     'rf_label_temp':'Temp ≥ (°C)',
     'rf_label_gcs':'GCS total ≤',
     'analyzing':'Analyzing...',
+    'warming':'Model warming up — you can start filling in the form; the recommendation appears as soon as it is ready.',
+    'load_failed':'Failed to load triage pipeline. Ensure TensorFlow Text matches your TF version (e.g., tensorflow==2.12.* with tensorflow-text==2.12.*). Details: ',
     'prediction_failed':'Prediction failed: ',
     'below_cutoffs':'All risks below cutoffs',
     'vital_redflags_prefix':'Vital red‑flags: ',
@@ -148,6 +141,44 @@ LANGS = {
     'actions_l3':["Assign to **Yellow zone** (Urgent)","Timely assessment; monitoring as indicated","IV/symptomatic care as needed"],
     'actions_l4':["Assign to **Green zone** (Minor)","Symptomatic relief; basic tests per protocol"],
     'actions_l5':["Assign to **White zone** (Fast‑track/clinic)","Safety‑net instructions and follow‑up advice"],
+    'batch_tab':'Batch triage (CSV)',
+    'batch_help':'Upload a CSV with one visit per row and columns: ',
+    'batch_upload':'Visits CSV',
+    'batch_missing':'Missing columns: ',
+    'batch_done':'Scored {n} visits in {sec:.1f} s',
+    'batch_download':'Download batch results (CSV)',
+    'audit_tab':'Prediction audit',
+    'audit_help':'Predictions saved with “Save prediction log” (this device).',
+    'audit_dates':'Date range',
+    'audit_levels':'Triage levels',
+    'audit_arrival':'Arrival mode',
+    'audit_any':'Any',
+    'audit_min_icu':'ICU risk greater than',
+    'audit_page':'Page',
+    'audit_page_size':'Rows per page',
+    'audit_showing':'Showing {first}–{last} of {total} predictions ({ms:.0f} ms)',
+    'audit_empty':'No logged predictions match these filters.',
+    'diagnostics':'Latency diagnostics',
+    'diagnostics_help':'Rolling window of the last {n} calls per stage, in ms.',
+    'diagnostics_empty':'No requests timed yet.',
+    'sim_tab':'Cutoff simulator',
+    'sim_help':'Re-triage past patients under every cutoff combination in the ranges below. Uploaded files need pred_<outcome> probability columns and vitals; optional outcome columns (icu_admission, or, et, 7_day_death) enable over/under-triage.',
+    'sim_source':'Patients',
+    'sim_source_logs':'Logged predictions (this device)',
+    'sim_source_upload':'Upload CSV / Parquet',
+    'sim_upload':'Predictions file',
+    'sim_no_data':'No patients to simulate yet.',
+    'sim_missing':'Missing prediction columns: ',
+    'sim_step':'Cutoff step',
+    'sim_max_under':'Max under‑triage',
+    'sim_done':'Evaluated {k} cutoff sets over {n} patients in {ms:.0f} ms',
+    'sim_current':'Current sidebar cutoffs',
+    'sim_best':'Cutoff sets (lowest over‑triage within the under‑triage limit first)',
+    'sim_no_outcomes':'No outcome columns found — showing level distribution only.',
+    'sim_download':'Download simulation (CSV)',
+    'sim_run':'Run simulation',
+    'sim_stale':'Press "Run simulation" to evaluate the cutoff ranges above (re‑run after changing patients, ranges or sidebar settings).',
+    'sim_prepare_csv':'Prepare CSV download',
   },
   'th': {
     'title': 'ตัวช่วยคัดแยกผู้ป่วยฉุกเฉิน (หน้า ER)',
@@ -162,8 +193,8 @@ LANGS = {
     'triage':'ระดับคัดแยก','zone':'โซนที่แนะนำ','actions':'การดำเนินการทันที','why':'เหตุผล',
     'outcomes':'ความน่าจะเป็นของผลลัพธ์','download':'ดาวน์โหลดผลลัพธ์ (CSV)',
     'cutoffs':'ค่าตัดสินใจของระดับคัดแยก','cut_l1':'ระดับ 1: ความเสี่ยงวิกฤต ≥','cut_l2':'ระดับ 2: ความเสี่ยงวิกฤต ≥','cut_l3':'ระดับ 3: ความเสี่ยงทรัพยากรเร่งด่วน ≥','cut_l4':'ระดับ 4: ความเสี่ยงทรัพยากรเล็กน้อย ≥',
-    'redflags_toggle':'เปิดใช้สัญญาณเตือนชีพ (ปรับเป็นระดับ 1 อัตโนมัติ)','redflags':'เกณฑ์สัญญาณเตือนชีพ','save_log':'บันทึกผลลง CSV',
-    'advanced':'ขั้นสูง (ตำแหน่งไฟล์โมเดล)','num_preproc':'ตัวประมวลผลตัวเลข','keras_model':'ไฟล์โมเดล Keras','keras_weights':'ไฟล์น้ำหนัก (ถ้ามี)','embedder':'ตัวแปลงข้อความ (TF‑Hub)',
+    'redflags_toggle':'เปิดใช้สัญญาณเตือนชีพ (ปรับเป็นระดับ 1 อัตโนมัติ)','redflags':'เกณฑ์สัญญาณเตือนชีพ','save_log':'บันทึกผลการประเมิน',
+    'advanced':'ขั้นสูง (ตำแหน่งไฟล์โมเดล)','num_preproc':'ตัวประมวลผลตัวเลข','keras_model':'ไฟล์โมเดล Keras','keras_weights':'ไฟล์น้ำหนัก (ถ้ามี)','calibration':'ตารางปรับเทียบความน่าจะเป็น (ถ้ามี)','embedder':'ตัวแปลงข้อความ (TF‑Hub)',
     'footer_note':'เครื่องมือนี้ช่วยประกอบการตัดสินใจ ไม่ทดแทนวิจารณญาณทางคลินิก โปรดปฏิบัติตามแนวทางของหน่วยงาน',
     'footer_evidence':'หลักฐาน: ตรวจสอบภายในบนข้อมูล 163,452 เคส (ปี 2018–2022) ที่ รพ.มหาราชเชียงใหม่ XGBoost AUROC 0.917; AUPRC 0.629; ทดสอบความเสถียรด้วย bootstrap และการสอบเทียบ ผลงานพิมพ์ล่วงหน้า:',
     'footer_team':'ทีม: นพ.ปฏิภาณ สิทธิประเวศ, รศ.นพ.บวร วิทยชำนาญกุล, ผศ.ดร.วชิรนันท์ ศิริกุล, อ.นพ.กอสิน เลาหะวิสุทธิ์ — คณะแพทยศาสตร์ มช. (เวชศาสตร์ฉุกเฉิน & อินฟอร์แมติกส์)',
@@ -178,6 +209,8 @@ LANGS = {
     'rf_label_temp':'อุณหภูมิ ≥ (°C)',
     'rf_label_gcs':'GCS รวม ≤',
     'analyzing':'กำลังประมวลผล...',
+    'warming':'กำลังเตรียมโมเดล — เริ่มกรอกข้อมูลได้เลย ระบบจะแสดงคำแนะนำเมื่อโมเดลพร้อม',
+    'load_failed':'ไม่สามารถโหลดโมเดลได้ โปรดตรวจสอบว่า TensorFlow Text ตรงกับรุ่นของ TensorFlow รายละเอียด: ',
     'prediction_failed':'ไม่สามารถประมวลผลได้: ',
     'below_cutoffs':'ความเสี่ยงทั้งหมดต่ำกว่าค่าตัดสินใจ',
     'vital_redflags_prefix':'สัญญาณเตือนชีพ: ',
@@ -187,6 +220,44 @@ LANGS = {
     'actions_l3':["ส่งเข้าโซนเหลือง (เร่งด่วน)", "ประเมินตามลำดับความเร่งด่วน", "ให้ IV/ยา ตามความจำเป็น"],
     'actions_l4':["ส่งเข้าโซนเขียว (อาการเล็กน้อย)", "ให้การดูแลตามอาการ/พิจารณาตรวจพื้นฐาน"],
     'actions_l5':["ส่งเข้าโซนขาว (Fast‑track/คลินิก)", "แจ้งสัญญาณอันตรายและคำแนะนำกลับมาพบแพทย์"],
+    'batch_tab':'คัดแยกหลายราย (CSV)',
+    'batch_help':'อัปโหลดไฟล์ CSV หนึ่งแถวต่อหนึ่งเคส โดยมีคอลัมน์: ',
+    'batch_upload':'ไฟล์ CSV ของผู้ป่วย',
+    'batch_missing':'ไม่พบคอลัมน์: ',
+    'batch_done':'ประมวลผล {n} เคส ใน {sec:.1f} วินาที',
+    'batch_download':'ดาวน์โหลดผลลัพธ์ทั้งหมด (CSV)',
+    'audit_tab':'ตรวจสอบย้อนหลัง',
+    'audit_help':'ผลการประเมินที่บันทึกไว้ด้วย “บันทึกผลการประเมิน” (เฉพาะเครื่องนี้)',
+    'audit_dates':'ช่วงวันที่',
+    'audit_levels':'ระดับการคัดแยก',
+    'audit_arrival':'วิธีมา ER',
+    'audit_any':'ทั้งหมด',
+    'audit_min_icu':'ความเสี่ยง ICU มากกว่า',
+    'audit_page':'หน้า',
+    'audit_page_size':'จำนวนแถวต่อหน้า',
+    'audit_showing':'แสดง {first}–{last} จาก {total} รายการ ({ms:.0f} ms)',
+    'audit_empty':'ไม่พบรายการที่ตรงกับเงื่อนไข',
+    'diagnostics':'เวลาประมวลผล (diagnostics)',
+    'diagnostics_help':'ค่าจาก {n} ครั้งล่าสุดของแต่ละขั้นตอน หน่วย ms',
+    'diagnostics_empty':'ยังไม่มีการประเมิน',
+    'sim_tab':'จำลองค่าตัดสินใจ',
+    'sim_help':'คัดแยกผู้ป่วยย้อนหลังใหม่ภายใต้ทุกชุดค่าตัดสินใจในช่วงด้านล่าง ไฟล์ที่อัปโหลดต้องมีคอลัมน์ความน่าจะเป็น pred_<ผลลัพธ์> และสัญญาณชีพ หากมีคอลัมน์ผลลัพธ์จริง (icu_admission, or, et, 7_day_death) จะคำนวณ over/under‑triage ให้',
+    'sim_source':'ข้อมูลผู้ป่วย',
+    'sim_source_logs':'ผลการประเมินที่บันทึกไว้ (เครื่องนี้)',
+    'sim_source_upload':'อัปโหลด CSV / Parquet',
+    'sim_upload':'ไฟล์ผลการประเมิน',
+    'sim_no_data':'ยังไม่มีข้อมูลผู้ป่วยสำหรับจำลอง',
+    'sim_missing':'ไม่พบคอลัมน์ความน่าจะเป็น: ',
+    'sim_step':'ช่วงห่างของค่าตัดสินใจ',
+    'sim_max_under':'Under‑triage สูงสุด',
+    'sim_done':'ประเมิน {k} ชุดค่าตัดสินใจ กับผู้ป่วย {n} ราย ใน {ms:.0f} ms',
+    'sim_current':'ค่าตัดสินใจปัจจุบัน (แถบด้านข้าง)',
+    'sim_best':'ชุดค่าตัดสินใจ (over‑triage ต่ำสุดภายใต้เกณฑ์ under‑triage ก่อน)',
+    'sim_no_outcomes':'ไม่พบคอลัมน์ผลลัพธ์จริง — แสดงเฉพาะการกระจายระดับ',
+    'sim_download':'ดาวน์โหลดผลการจำลอง (CSV)',
+    'sim_run':'เริ่มจำลอง',
+    'sim_stale':'กด "เริ่มจำลอง" เพื่อประเมินช่วงค่าตัดสินใจด้านบน (กดใหม่หลังเปลี่ยนข้อมูลผู้ป่วย ช่วงค่า หรือการตั้งค่าในแถบด้านข้าง)',
+    'sim_prepare_csv':'เตรียมไฟล์ CSV',
   }
 }
 
@@ -222,40 +293,54 @@ ZONE_MAP = {
 # Cached loaders (no re-fit)
 # ---------------------------
 @st.cache_resource(show_spinner=False)
-def load_preprocessor(num_preprocessor_path: str) -> DataPreprocessing:
-    dp = DataPreprocessing()
-    dp.num_preprocessor = joblib.load(num_preprocessor_path)
-    try:
-        dp.x_num_cols = NUM_COLS
-        dp.x_text_cols = TEXT_COLS
-        dp.y_cols = TARGETS
-    except Exception:
-        pass
-    return dp
-
-# @st.cache_resource(show_spinner=False)
-# def load_embedder(embedder_url: str):
-#     # tensorflow_text import above ensures custom ops are registered for multilingual USE
-#     return hub.load(embedder_url)
+def load_pipeline(num_preprocessor_path: str, model_path: str, weights_path: str, embedder_url: str,
+                  calibration_path: str) -> TriagePipeline:
+    # Preprocessor, embedder (with its embedding cache), Keras model and calibration tables, shared by all sessions.
+    # Loads and warms up in background threads so the form renders immediately after a redeploy.
+    return TriagePipeline(num_preprocessor_path, model_path, weights_path, embedder_url, background=True,
+                          calibration_path=calibration_path)
+
 
 @st.cache_resource(show_spinner=False)
-def load_embedder(url: str):
-    try:
-        # tensorflow_text import above ensures custom ops are registered
-        return hub.load(url)
-    except Exception as e:
-        st.error("Failed to load text embedder. Ensure TensorFlow Text matches your TF version (e.g., tensorflow==2.12.* with tensorflow-text==2.12.*)." 
-                 f"Details: {type(e).__name__}: {e}")
-        raise
+def load_batcher(_pipeline: TriagePipeline, pipeline_key: tuple) -> MicroBatcher:
+    # pipeline_key identifies the pipeline (the leading underscore keeps Streamlit from hashing it)
+    return MicroBatcher(_pipeline, MICRO_BATCH_SIZE, MICRO_BATCH_WAIT_MS)
+
+
+@st.cache_resource(show_spinner=False)
+def load_metrics_server(port: int):
+    # Optional Prometheus endpoint for this Streamlit process (TRIAGE_METRICS_PORT)
+    return start_metrics_server(METRICS, port=port)
+
+if os.environ.get("TRIAGE_METRICS_PORT"):
+    load_metrics_server(int(os.environ["TRIAGE_METRICS_PORT"]))
+
+
+@st.cache_resource(show_spinner=False)
+def load_audit_store() -> AuditStore:
+    # Indexed SQLite copy of the prediction log for audit queries
+    return AuditStore()
 
 
 @st.cache_resource(show_spinner=False)
-def load_model(model_path: str, weights_path: str) -> TriageModel:
-    tm = TriageModel()
-    tm.import_model(model_path)
-    if os.path.exists(weights_path):
-        tm.load_weights(weights_path)
-    return tm
+def load_log_writer() -> PredictionLogWriter:
+    # One background Parquet writer per process; write_log only enqueues.
+    # Each flushed batch is also inserted into the audit store from the writer thread.
+    writer = PredictionLogWriter("logs")
+    writer.sinks.append(load_audit_store().insert_many)
+    return writer
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_logged_predictions(signature: tuple) -> pd.DataFrame:
+    # signature = log_signature("logs"): reruns reuse the parsed logs until a new file rotates in
+    return read_prediction_logs("logs")
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def read_sim_upload(data: bytes, name: str) -> pd.DataFrame:
+    buffer = io.BytesIO(data)
+    return pd.read_parquet(buffer) if name.endswith('.parquet') else pd.read_csv(buffer)
 
 # ---------------------------
 # Sidebar — language, cutoffs, red‑flags
@@ -295,60 +380,49 @@ with st.sidebar:
         num_prep_path = st.text_input(T['num_preproc'], value=DEFAULT_PATHS["num_preprocessor"]) 
         keras_model_path = st.text_input(T['keras_model'], value=DEFAULT_PATHS["keras_model"]) 
         keras_weights_path = st.text_input(T['keras_weights'], value=DEFAULT_PATHS["keras_weights"]) 
-        embedder_url = st.text_input(T['embedder'], value="https://www.kaggle.com/models/google/universal-sentence-encoder/TensorFlow2/multilingual/2")
+        calibration_path = st.text_input(T['calibration'], value=DEFAULT_PATHS["calibration"])
+        embedder_url = st.text_input(T['embedder'], value=DEFAULT_EMBEDDER_URL)
+
+cutoffs = {'lvl1': lvl1_cut, 'lvl2': lvl2_cut, 'lvl3': lvl3_cut, 'lvl4': lvl4_cut}
+red_flag_thresholds = {'sbp': rf_sbp, 'o2sat': rf_o2, 'rr': rf_rr_hi, 'temp': rf_temp_hi, 'gcs': rf_gcs}
 
 # Load artifacts once
-preprocessor = load_preprocessor(num_prep_path)
-embedder = load_embedder(embedder_url)
-model = load_model(keras_model_path, keras_weights_path)
+pipeline_key = (num_prep_path, keras_model_path, keras_weights_path, embedder_url, calibration_path)
+pipeline = load_pipeline(*pipeline_key)
+batcher = load_batcher(pipeline, pipeline_key)
 
 # ---------------------------
 # Helpers
 # ---------------------------
 
 def embed_text(text: str) -> np.ndarray:
-    return np.array(embedder([str(text)]))
+    # Repeat complaints are served from the embedding cache without touching the encoder
+    return pipeline.embed([text])
 
 
-def vital_red_flags(v: dict) -> list[str]:
-    flags = []
-    if v.get('sbp', 999) < rf_sbp: flags.append(f"SBP < {rf_sbp}")
-    if v.get('o2sat', 100) < rf_o2: flags.append(f"SpO₂ < {rf_o2}%")
-    if v.get('rr', 0) > rf_rr_hi: flags.append(f"RR > {rf_rr_hi}")
-    if v.get('temp', 0) >= rf_temp_hi: flags.append(f"Temp ≥ {rf_temp_hi}°C")
-    gcs_total = v.get('gcs_e', 4) + v.get('gcs_v', 5) + v.get('gcs_m', 6)
-    if gcs_total <= rf_gcs: flags.append(f"GCS ≤ {rf_gcs}")
-    return flags
+def triage_decision(preds: dict, vitals: dict) -> tuple[int, str, list[str]]:
+    with METRICS.time('triage_decision'):
+        return _triage_decision(preds, vitals)
 
 
-def triage_decision(preds: dict, vitals: dict) -> tuple[int, str, list[str]]:
-    critical = max(preds.get('7_day_death', 0), preds.get('icu_admission', 0), preds.get('et', 0), preds.get('or', 0))
-    urgent = max(preds.get('admission', 0), preds.get('inject', 0), preds.get('consult', 0))
-    minor  = max(preds.get('lab', 0), preds.get('xray', 0))
-
-    rationale = []
-
-    if apply_redflags:
-        flags = vital_red_flags(vitals)
-        if flags:
-            rationale.append((T['vital_redflags_prefix']) + ", ".join(flags))
-            return 1, LEVEL_MAP[1][1], rationale
-
-    if critical >= lvl1_cut:
-        rationale.append(("Critical risk " if LANG_KEY=='en' else "ความเสี่ยงวิกฤต ") + f"{critical*100:.1f}% ≥ L1 {lvl1_cut*100:.0f}%")
-        return 1, LEVEL_MAP[1][1], rationale
-    if critical >= lvl2_cut:
-        rationale.append(("Critical risk " if LANG_KEY=='en' else "ความเสี่ยงวิกฤต ") + f"{critical*100:.1f}% ≥ L2 {lvl2_cut*100:.0f}%")
-        return 2, LEVEL_MAP[2][1], rationale
-    if urgent >= lvl3_cut:
-        rationale.append(("Urgent resource risk " if LANG_KEY=='en' else "ความเสี่ยงทรัพยากรเร่งด่วน ") + f"{urgent*100:.1f}% ≥ L3 {lvl3_cut*100:.0f}%")
-        return 3, LEVEL_MAP[3][1], rationale
-    if minor >= lvl4_cut:
-        rationale.append(("Minor resource risk " if LANG_KEY=='en' else "ความเสี่ยงทรัพยากรเล็กน้อย ") + f"{minor*100:.1f}% ≥ L4 {lvl4_cut*100:.0f}%")
-        return 4, LEVEL_MAP[4][1], rationale
-
-    rationale.append(T['below_cutoffs'])
-    return 5, LEVEL_MAP[5][1], rationale
+def _triage_decision(preds: dict, vitals: dict) -> tuple[int, str, list[str]]:
+    level, reason, score, flags = triage_level(preds, vitals, cutoffs, red_flag_thresholds, apply_redflags)
+    return level, LEVEL_MAP[level][1], [_rationale(level, reason, score, flags)]
+
+
+def _rationale(level: int, reason: str, score: float, flags: list[str]) -> str:
+    if reason == 'red_flags':
+        rationale = (T['vital_redflags_prefix']) + ", ".join(flags)
+    elif reason == 'critical':
+        cut = lvl1_cut if level == 1 else lvl2_cut
+        rationale = ("Critical risk " if LANG_KEY=='en' else "ความเสี่ยงวิกฤต ") + f"{score*100:.1f}% ≥ L{level} {cut*100:.0f}%"
+    elif reason == 'urgent':
+        rationale = ("Urgent resource risk " if LANG_KEY=='en' else "ความเสี่ยงทรัพยากรเร่งด่วน ") + f"{score*100:.1f}% ≥ L3 {lvl3_cut*100:.0f}%"
+    elif reason == 'minor':
+        rationale = ("Minor resource risk " if LANG_KEY=='en' else "ความเสี่ยงทรัพยากรเล็กน้อย ") + f"{score*100:.1f}% ≥ L4 {lvl4_cut*100:.0f}%"
+    else:
+        rationale = T['below_cutoffs']
+    return rationale
 
 
 def zone_for_level(level: int) -> tuple[str, str]:
@@ -383,19 +457,41 @@ def _map_case_to_model_token(c: str) -> str:
     return mapping.get(c, c)
 
 
+def _input_hash(row_df: pd.DataFrame) -> str:
+    """Stable hash of the submitted model inputs (tokens, vitals and complaint text)."""
+    return hashlib.sha256(row_df.to_json(orient='records', force_ascii=False).encode('utf-8')).hexdigest()
+
+
 def predict_single(row_df: pd.DataFrame) -> dict[str, float]:
-    num_X = preprocessor.num_preprocessor.transform(row_df[NUM_COLS])
-    text_vec = np.array(embedder([row_df.loc[row_df.index[0], 'cc']]))
-    preds = model.model.predict([num_X, text_vec], verbose=0)
-    flat = preds[0] if isinstance(preds, (list, tuple)) else preds
-    flat = np.asarray(flat).reshape(-1)
-    return {t: float(p) for t, p in zip(TARGETS, flat)}
+    # Queue wait, preprocessing, embedding and Keras stages are recorded inside the batcher / pipeline
+    with METRICS.time('model_total'):
+        return batcher.predict_single(row_df)
+
+
+def predict_batch(df: pd.DataFrame, batch_size: int = 1024) -> pd.DataFrame:
+    # One preprocessor call, batched (cached) embedding and chunked Keras inference for the whole frame
+    return pipeline.predict_batch(df, batch_size=batch_size)
+
+
+def triage_batch(df: pd.DataFrame, probs: pd.DataFrame) -> pd.DataFrame:
+    # Vectorized rules, deliberately untimed: batch rows must not push the single-patient
+    # samples out of the 'triage_decision' latency window
+    vitals = df[VITAL_COLS].reset_index(drop=True)
+    levels, reasons, scores = triage_levels(probs, vitals, cutoffs, red_flag_thresholds, apply_redflags)
+    flagged = {i: vital_red_flags(vitals.iloc[i].to_dict(), red_flag_thresholds) for i in np.flatnonzero(reasons == 'red_flags')}
+    zone_names = {level: zone_for_level(level)[0] for level in LEVEL_MAP}
+
+    out = pd.concat([df, probs.add_prefix('pred_')], axis=1)
+    out['triage_level'] = levels.astype(int)
+    out['zone'] = [zone_names[level] for level in out['triage_level']]
+    out['why'] = [_rationale(int(level), reason, float(score), flagged.get(i, []))
+                  for i, (level, reason, score) in enumerate(zip(levels, reasons, scores))]
+    return out
 
 
 def write_log(single_input: dict, preds: dict, level: int):
     if not log_predictions:
         return
-    os.makedirs("logs", exist_ok=True)
     row = {
         "timestamp": datetime.now().isoformat(timespec='seconds'),
         "session": st.session_state.get('session_id'),
@@ -403,8 +499,9 @@ def write_log(single_input: dict, preds: dict, level: int):
         **{f"pred_{k}": v for k, v in preds.items()},
         "triage_level": level,
     }
-    path = os.path.join("logs", "predictions.csv")
-    pd.DataFrame([row]).to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    # Batched into logs/predictions-*.parquet by a background thread
+    with METRICS.time('log'):
+        load_log_writer().write(row)
 
 # Stable session id
 if 'session_id' not in st.session_state:
@@ -458,53 +555,269 @@ with left:
 
 with right:
     st.subheader(T['recommendation'])
+    if pipeline.status == 'loading':
+        st.info(T['warming'])
+    elif pipeline.status == 'failed':
+        st.error(T['load_failed'] + f"{type(pipeline.loader.error).__name__}: {pipeline.loader.error}")
+        # Retry the load on the next rerun instead of caching the failure
+        load_pipeline.clear()
+        load_batcher.clear()
+
+    # Probabilities depend only on the submitted patient and the loaded model, so they are kept in
+    # session state and cutoff / language / red-flag changes re-render the decision without a model call
     if submitted and input_df is not None:
-        with st.spinner(T['analyzing']):
+        single_key = (pipeline_key, _input_hash(input_df))
+        if st.session_state.get('single_key') != single_key:
+            with st.spinner(T['analyzing']):
+                try:
+                    st.session_state['single_preds'] = predict_single(input_df)
+                    st.session_state['single_input'] = input_df.iloc[0].to_dict()
+                    st.session_state['single_vitals'] = dict(sbp=sbp, o2sat=o2sat, rr=rr, temp=temp,
+                                                             gcs_e=gcs_e, gcs_v=gcs_v, gcs_m=gcs_m)
+                    st.session_state['single_key'] = single_key
+                except Exception as e:
+                    st.error((T['prediction_failed']) + f"{type(e).__name__}: {e}")
+                    st.session_state.pop('single_key', None)
+
+    single_key = st.session_state.get('single_key')
+    if single_key is not None and single_key[0] == pipeline_key:
+        try:
+            preds = st.session_state['single_preds']
+            single_input = st.session_state['single_input']
+            level, css, why = triage_decision(preds, st.session_state['single_vitals'])
+            lvl_name = LEVEL_MAP[level][0][LANG_KEY]
+            zone_name, zone_area = zone_for_level(level)
+
+            st.markdown(f"<span class='badge {css}'>"+T['triage']+f": {level} — {lvl_name}</span>", unsafe_allow_html=True)
+            st.markdown(f"<span class='badge {css}'>"+T['zone']+f": {zone_name} — {zone_area}</span>", unsafe_allow_html=True)
+
+            with st.container(border=True):
+                st.markdown("**"+T['actions']+"**")
+                for a in actions_for_level(level):
+                    st.write("• ", a)
+                st.caption((T['why']+": ") + "; ".join(why))
+
+            st.markdown("---")
+            st.markdown("**"+T['outcomes']+"**")
+            cols = st.columns(3)
+            for i, t in enumerate(TARGETS):
+                with cols[i % 3]:
+                    with st.container(border=True):
+                        p = preds[t]
+                        label = TARGET_LABELS[t][LANG_KEY]
+                        st.markdown(f"**{label}**")
+                        st.metric(T['probability'], f"{p*100:.1f}%")
+                        st.progress(min(max(p, 0.0), 1.0))
+
+            # Download result
+            out_row = {**single_input, **{f"pred_{k}": v for k, v in preds.items()}, "triage_level": level, "zone": zone_name}
+            out_df = pd.DataFrame([out_row])
+            st.download_button(
+                T['download'],
+                data=out_df.to_csv(index=False).encode('utf-8'),
+                file_name=f"triage_result_{int(time.time())}.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
+
+            # One log row per submission, not per what-if rerun
+            if submitted and log_predictions:
+                write_log(single_input, preds, level)
+
+        except Exception as e:
+            st.error((T['prediction_failed']) + f"{type(e).__name__}: {e}")
+
+# ---------------------------
+# UI — Batch triage (CSV upload)
+# ---------------------------
+st.markdown("---")
+tab_batch, tab_audit, tab_sim = st.tabs([T['batch_tab'], T['audit_tab'], T['sim_tab']])
+
+with tab_batch:
+    st.caption(T['batch_help'] + ", ".join(NUM_COLS + TEXT_COLS))
+    uploaded = st.file_uploader(T['batch_upload'], type=['csv'])
+    if uploaded is not None:
+        batch_df = pd.read_csv(uploaded)
+        missing = [c for c in NUM_COLS + TEXT_COLS if c not in batch_df.columns]
+        if missing:
+            st.error(T['batch_missing'] + ", ".join(missing))
+        else:
             try:
-                preds = predict_single(input_df)
-                vitals = dict(sbp=sbp, o2sat=o2sat, rr=rr, temp=temp, gcs_e=gcs_e, gcs_v=gcs_v, gcs_m=gcs_m)
-                level, css, why = triage_decision(preds, vitals)
-                lvl_name = LEVEL_MAP[level][0][LANG_KEY]
-                zone_name, zone_area = zone_for_level(level)
-
-                st.markdown(f"<span class='badge {css}'>"+T['triage']+f": {level} — {lvl_name}</span>", unsafe_allow_html=True)
-                st.markdown(f"<span class='badge {css}'>"+T['zone']+f": {zone_name} — {zone_area}</span>", unsafe_allow_html=True)
-
-                with st.container(border=True):
-                    st.markdown("**"+T['actions']+"**")
-                    for a in actions_for_level(level):
-                        st.write("• ", a)
-                    st.caption((T['why']+": ") + "; ".join(why))
-
-                st.markdown("---")
-                st.markdown("**"+T['outcomes']+"**")
-                cols = st.columns(3)
-                for i, t in enumerate(TARGETS):
-                    with cols[i % 3]:
-                        with st.container(border=True):
-                            p = preds[t]
-                            label = TARGET_LABELS[t][LANG_KEY]
-                            st.markdown(f"**{label}**")
-                            st.metric(T['probability'], f"{p*100:.1f}%")
-                            st.progress(min(max(p, 0.0), 1.0))
-
-                # Download result
-                out_row = {**input_df.iloc[0].to_dict(), **{f"pred_{k}": v for k, v in preds.items()}, "triage_level": level, "zone": zone_name}
-                out_df = pd.DataFrame([out_row])
+                # Probabilities do not depend on cutoffs, so keep them across reruns for the same file contents
+                # and model (a re-export with the same name and size must not reuse the old probabilities)
+                cache_key = (pipeline_key, hashlib.sha256(uploaded.getvalue()).hexdigest())
+                if st.session_state.get('batch_key') != cache_key:
+                    with st.spinner(T['analyzing']):
+                        t0 = time.perf_counter()
+                        st.session_state['batch_probs'] = predict_batch(batch_df)
+                        st.session_state['batch_seconds'] = time.perf_counter() - t0
+                        st.session_state['batch_key'] = cache_key
+
+                result_df = triage_batch(batch_df, st.session_state['batch_probs'])
+                st.caption(T['batch_done'].format(n=len(result_df), sec=st.session_state['batch_seconds']))
+                st.dataframe(result_df, use_container_width=True, hide_index=True)
                 st.download_button(
-                    T['download'],
-                    data=out_df.to_csv(index=False).encode('utf-8'),
-                    file_name=f"triage_result_{int(time.time())}.csv",
+                    T['batch_download'],
+                    data=result_df.to_csv(index=False).encode('utf-8'),
+                    file_name=f"triage_batch_{int(time.time())}.csv",
                     mime="text/csv",
                     use_container_width=True,
                 )
-
-                if log_predictions:
-                    write_log(input_df.iloc[0].to_dict(), preds, level)
-
             except Exception as e:
                 st.error((T['prediction_failed']) + f"{type(e).__name__}: {e}")
 
+# ---------------------------
+# UI — Prediction audit (indexed SQLite store, paged)
+# ---------------------------
+with tab_audit:
+    st.caption(T['audit_help'])
+    audit = load_audit_store()
+    a1, a2, a3, a4 = st.columns([2, 2, 1, 1])
+    with a1:
+        today = datetime.now().date()
+        date_range = st.date_input(T['audit_dates'], value=(today - pd.Timedelta(days=7), today))
+    with a2:
+        audit_levels = st.multiselect(T['audit_levels'], options=[1, 2, 3, 4, 5], default=[])
+    with a3:
+        arrival_options = {T['audit_any']: None, T['walkin']: 'Walkin', T['ems']: 'EMS', T['referral']: 'Referral'}
+        audit_arrival = arrival_options[st.selectbox(T['audit_arrival'], options=list(arrival_options))]
+    with a4:
+        audit_min_icu = st.number_input(T['audit_min_icu'], min_value=0.0, max_value=1.0, value=0.0, step=0.05)
+
+    # date_input returns a 1-tuple while the user is still picking the end date
+    start_date = date_range[0] if date_range else None
+    end_date = date_range[1] if len(date_range) > 1 else start_date
+    filters = {
+        'start': start_date.isoformat() if start_date else None,
+        'end': (end_date + pd.Timedelta(days=1)).isoformat() if end_date else None,
+        'levels': audit_levels or None,
+        'arrival': audit_arrival,
+        'min_icu': audit_min_icu if audit_min_icu > 0 else None,
+    }
+
+    t0 = time.perf_counter()
+    total = audit.count(**filters)
+    p1, p2 = st.columns(2)
+    with p2:
+        page_size = st.selectbox(T['audit_page_size'], options=[25, 50, 100, 200], index=1)
+    with p1:
+        n_pages = max(1, -(-total // page_size))
+        page = st.number_input(T['audit_page'], min_value=1, max_value=n_pages, value=1, step=1)
+    audit_df = audit.query(limit=page_size, offset=(page - 1) * page_size, **filters)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    if total == 0:
+        st.info(T['audit_empty'])
+    else:
+        first = (page - 1) * page_size + 1
+        st.caption(T['audit_showing'].format(first=first, last=first + len(audit_df) - 1, total=total, ms=elapsed_ms))
+        st.dataframe(audit_df, use_container_width=True, hide_index=True)
+
+# ---------------------------
+# UI — Cutoff simulator (vectorized re-triage of past patients)
+# ---------------------------
+with tab_sim:
+    # Tabs run on every rerun, so logs are parsed once per file set and the simulation only runs on request
+    st.caption(T['sim_help'])
+    source = st.radio(T['sim_source'], options=[T['sim_source_logs'], T['sim_source_upload']], horizontal=True)
+    sim_df, sim_source_key = None, None
+    if source == T['sim_source_logs']:
+        sim_source_key = log_signature("logs")
+        sim_df = load_logged_predictions(sim_source_key)
+    else:
+        sim_file = st.file_uploader(T['sim_upload'], type=['csv', 'parquet'])
+        if sim_file is not None:
+            sim_bytes = sim_file.getvalue()
+            sim_source_key = hashlib.sha256(sim_bytes).hexdigest()
+            sim_df = read_sim_upload(sim_bytes, sim_file.name)
+
+    pred_cols = [f"pred_{t}" for t in TARGETS]
+    if sim_df is None or len(sim_df) == 0:
+        st.info(T['sim_no_data'])
+    elif any(c not in sim_df.columns for c in pred_cols):
+        st.error(T['sim_missing'] + ", ".join(c for c in pred_cols if c not in sim_df.columns))
+    else:
+        s1, s2, s3, s4 = st.columns(4)
+        with s1:
+            l1_range = st.slider(T['cut_l1'], 0.10, 0.90, (0.30, 0.70), 0.01, key='sim_l1')
+        with s2:
+            l2_range = st.slider(T['cut_l2'], 0.05, 0.80, (0.10, 0.50), 0.01, key='sim_l2')
+        with s3:
+            l3_range = st.slider(T['cut_l3'], 0.05, 0.80, (0.20, 0.60), 0.01, key='sim_l3')
+        with s4:
+            l4_range = st.slider(T['cut_l4'], 0.05, 0.80, (0.10, 0.50), 0.01, key='sim_l4')
+        sim_step = st.select_slider(T['sim_step'], options=[0.01, 0.02, 0.025, 0.05, 0.1], value=0.05)
+
+        outcome_cols = [t for t in TARGETS if t in sim_df.columns]
+        has_outcomes = any(t in outcome_cols for t in ('icu_admission', 'or', 'et', '7_day_death'))
+        sim_params = (source, sim_source_key, l1_range, l2_range, l3_range, l4_range, sim_step,
+                      tuple(cutoffs.items()), tuple(red_flag_thresholds.items()), apply_redflags)
+
+        if st.button(T['sim_run'], type='primary'):
+            preds_cols = sim_df[pred_cols].set_axis(TARGETS, axis=1)
+            outcomes = sim_df[outcome_cols] if has_outcomes else None
+            t0 = time.perf_counter()
+            grid = cutoff_grid(*[(lo, hi, sim_step) for lo, hi in (l1_range, l2_range, l3_range, l4_range)])
+            st.session_state['sim_result'] = {
+                'params': sim_params,
+                'sim': simulate(preds_cols, sim_df, grid, red_flag_thresholds, apply_redflags, outcomes=outcomes),
+                'current': simulate(preds_cols, sim_df, pd.DataFrame([cutoffs]), red_flag_thresholds, apply_redflags,
+                                    outcomes=outcomes),
+                'k': len(grid), 'n': len(sim_df), 'ms': (time.perf_counter() - t0) * 1000,
+            }
+            st.session_state.pop('sim_csv', None)
+
+        result = st.session_state.get('sim_result')
+        if result is None or result['params'] != sim_params:
+            st.info(T['sim_stale'])
+        else:
+            sim, current = result['sim'], result['current']
+            st.caption(T['sim_done'].format(k=result['k'], n=result['n'], ms=result['ms']))
+
+            level_cols = [f'level_{i}' for i in range(1, 6)]
+            st.markdown(f"**{T['sim_current']}**")
+            st.bar_chart(current[level_cols].T.rename(columns={0: T['sim_current']}))
+            max_under = None
+            if not has_outcomes:
+                st.info(T['sim_no_outcomes'])
+                ranked = sim
+            else:
+                st.dataframe(current[['under_triage', 'over_triage']].round(4), hide_index=True)
+                max_under = st.slider(T['sim_max_under'], 0.0, 0.5, 0.05, 0.01)
+                ranked = pd.concat([
+                    sim[sim['under_triage'] <= max_under].sort_values(['over_triage', 'under_triage']),
+                    sim[sim['under_triage'] > max_under].sort_values(['under_triage', 'over_triage']),
+                ])
+            st.markdown(f"**{T['sim_best']}**")
+            st.dataframe(ranked.head(200).round(4), use_container_width=True, hide_index=True)
+
+            # The full CSV is only serialized when asked for, not on every rerun
+            csv_key = (sim_params, max_under)
+            if st.button(T['sim_prepare_csv']):
+                st.session_state['sim_csv'] = (csv_key, ranked.to_csv(index=False).encode('utf-8'))
+            prepared = st.session_state.get('sim_csv')
+            if prepared is not None and prepared[0] == csv_key:
+                st.download_button(
+                    T['sim_download'],
+                    data=prepared[1],
+                    file_name=f"cutoff_simulation_{int(time.time())}.csv",
+                    mime="text/csv",
+                    use_container_width=True,
+                )
+
+# ---------------------------
+# Sidebar — latency diagnostics (rendered last so it includes this run)
+# ---------------------------
+with st.sidebar:
+    with st.expander(T['diagnostics'], expanded=False):
+        summary = METRICS.summary()
+        if summary:
+            st.caption(T['diagnostics_help'].format(n=METRICS.window))
+            diag_df = pd.DataFrame.from_dict(summary, orient='index')[['count', 'p50_ms', 'p95_ms', 'p99_ms']]
+            st.dataframe(diag_df.round(2), use_container_width=True)
+        else:
+            st.caption(T['diagnostics_empty'])
+
 # ---------------------------
 # Footer / Evidence
 # ---------------------------
@@ -0,0 +1,280 @@
+# Inference micro-benchmarks
+# ---------------------------------------------------
+# Times the per-request hot path of both apps on synthetic patients with the
+# offline HashEncoder standing in for TF-Hub, so results are reproducible and
+# need no network. Benchmarks whose dependencies or artifacts are missing are
+# reported as skipped.
+#
+#   python -m benchmarks.run                                  # print + write JSON, compare to the baseline
+#   python -m benchmarks.run --save-baseline                  # store as the baseline
+#   python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+#
+# Exits with status 1 when any benchmark's p50 regresses beyond the tolerance,
+# and with status 2 when there is no baseline to compare against (timings are
+# machine-specific, so record one per machine with --save-baseline first).
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import HashEncoder, synthetic_patients
+from src.triage import TARGETS, NUM_COLS, TEXT_COLS, VITAL_COLS, DEFAULT_CUTOFFS, DEFAULT_RED_FLAGS, triage_level
+
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results.json")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+NUM_PREPROCESSOR_PATH = os.path.join("model", "num_preprocessor.joblib")
+XGB_MODEL_PATH = os.path.join("model", "xgb_model_calibrated.pkl")
+BATCH_ROWS = 256
+
+
+class Skip(Exception):
+    pass
+
+
+def _require(path):
+    if not os.path.exists(path):
+        raise Skip(f"{path} not found")
+
+
+# Each setup returns (call, rows_per_call, teardown or None)
+
+def bench_compiled_numeric(patients):
+    from src.numeric_preprocessor import CompiledNumericPreprocessor
+    _require(NUM_PREPROCESSOR_PATH)
+    compiled = CompiledNumericPreprocessor.from_column_transformer(joblib.load(NUM_PREPROCESSOR_PATH))
+    row = patients.iloc[:1]
+    return lambda: compiled.transform(row), 1, None
+
+
+def bench_sklearn_numeric(patients):
+    _require(NUM_PREPROCESSOR_PATH)
+    preprocessor = joblib.load(NUM_PREPROCESSOR_PATH)
+    row = patients.iloc[:1][NUM_COLS]
+    return lambda: preprocessor.transform(row), 1, None
+
+
+def _text_embedder():
+    from src.source import TextEmbedder
+    embedder = TextEmbedder("stand-in://hash-encoder", verbose=False)
+    embedder.embedder = HashEncoder()
+    return embedder
+
+
+def bench_data_preprocessing_transform(patients):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from src.source import DataPreprocessing
+    _require(NUM_PREPROCESSOR_PATH)
+
+    preprocessing = DataPreprocessing()
+    preprocessing.num_preprocessor = joblib.load(NUM_PREPROCESSOR_PATH)
+    preprocessing.text_preprocessor = ColumnTransformer([
+        ('text', SimpleImputer(strategy='constant', fill_value=' '), TEXT_COLS)
+    ]).fit(patients[TEXT_COLS])
+    preprocessing.text_embedder = _text_embedder()
+    preprocessing.x_num_cols, preprocessing.x_text_cols, preprocessing.y_cols = NUM_COLS, TEXT_COLS, TARGETS
+    batch = patients.iloc[:BATCH_ROWS]
+    return lambda: preprocessing.transform(batch), len(batch), None
+
+
+def bench_text_embedder_transform(patients):
+    embedder = _text_embedder()
+    texts = patients[TEXT_COLS].iloc[:BATCH_ROWS].to_numpy()
+    return lambda: embedder.transform(texts), len(texts), None
+
+
+def bench_triage_decision(patients):
+    rng = np.random.default_rng(0)
+    preds = {t: float(p) for t, p in zip(TARGETS, rng.random(len(TARGETS)) * 0.4)}
+    vitals = patients[VITAL_COLS].iloc[0].fillna(0).to_dict()
+    return lambda: triage_level(preds, vitals, DEFAULT_CUTOFFS, DEFAULT_RED_FLAGS, True), 1, None
+
+
+def bench_write_log(patients):
+    from src.prediction_log import PredictionLogWriter
+    writer = PredictionLogWriter(tempfile.mkdtemp(prefix="bench-logs-"))
+    row = {"timestamp": datetime.now().isoformat(timespec='seconds'), "session": "bench",
+           **patients.iloc[0].to_dict(), **{f"pred_{t}": 0.1 for t in TARGETS}, "triage_level": 3}
+    return lambda: writer.write(row), 1, writer.close
+
+
+def bench_app2_predict_single(patients):
+    from src.inference import TriagePipeline
+    for path in ("model/num_preprocessor.joblib", "model/model.keras"):
+        _require(path)
+    # No embedding cache, so every call exercises preprocessing, encoder and model
+    pipeline = TriagePipeline(embedder=HashEncoder(), cache_path=None, metrics=None)
+    row = patients.iloc[:1]
+    return lambda: pipeline.predict_single(row), 1, None
+
+
+def _app_model_and_inputs(patients):
+    import pickle
+    _require(XGB_MODEL_PATH)
+    with open(XGB_MODEL_PATH, 'rb') as f:
+        model = pickle.load(f)
+    encoder = HashEncoder()
+    row = patients.iloc[:1]
+    text_cols = [f'text_{i}' for i in range(encoder.dim)]
+    return model, encoder, row, text_cols
+
+
+def bench_app_predict_single(patients):
+    from src.direct_features import direct_predictor
+    model, encoder, row, text_cols = _app_model_and_inputs(patients)
+    values = row[NUM_COLS].iloc[0].tolist()
+    sample = pd.concat([row[NUM_COLS].reset_index(drop=True),
+                        pd.DataFrame(encoder([row['cc'].iloc[0]]), columns=text_cols)], axis=1)
+    direct = direct_predictor(model, NUM_COLS, text_cols, ['sex', 'how_come_er', 't_n'], sample=sample)
+    if direct is None:
+        raise Skip("direct feature path unsupported for this model")
+
+    def call():
+        # Same path as app.py: values + embedding into preallocated arrays, no DataFrame
+        use_vec = encoder([row['cc'].iloc[0]])
+        return float(direct.predict_proba(values, use_vec)[0][1])
+    return call, 1, None
+
+
+def bench_app_predict_single_lean(patients):
+    from src.direct_features import UnsupportedPipeline
+    from src.xgb_export import LeanXGBPredictor
+    model, encoder, row, text_cols = _app_model_and_inputs(patients)
+    values = row[NUM_COLS].iloc[0].tolist()
+    try:
+        lean = LeanXGBPredictor.from_model(model)
+    except UnsupportedPipeline as e:
+        raise Skip(f"lean export unsupported for this model: {e}")
+
+    def call():
+        # app.py with model/xgb_lean.joblib: inplace booster prediction + calibration lookup
+        use_vec = encoder([row['cc'].iloc[0]])
+        return float(lean.predict_proba(values, use_vec)[0][1])
+    return call, 1, None
+
+
+def bench_app_predict_single_dataframe(patients):
+    model, encoder, row, text_cols = _app_model_and_inputs(patients)
+
+    def call():
+        # app.py fallback: vitals + 512 embedding columns in one DataFrame
+        use_vec = encoder([row['cc'].iloc[0]]).reshape(1, -1)
+        input_df = pd.concat([row[NUM_COLS].reset_index(drop=True), pd.DataFrame(use_vec, columns=text_cols)], axis=1)
+        return float(model.predict_proba(input_df)[0][1])
+    return call, 1, None
+
+
+BENCHMARKS = {
+    'numeric_preprocess_compiled': bench_compiled_numeric,
+    'numeric_preprocess_sklearn': bench_sklearn_numeric,
+    'data_preprocessing_transform': bench_data_preprocessing_transform,
+    'text_embedder_transform': bench_text_embedder_transform,
+    'triage_decision': bench_triage_decision,
+    'write_log': bench_write_log,
+    'app2_predict_single': bench_app2_predict_single,
+    'app_predict_single': bench_app_predict_single,
+    'app_predict_single_lean': bench_app_predict_single_lean,
+    'app_predict_single_dataframe': bench_app_predict_single_dataframe,
+}
+
+
+def run_benchmark(setup, patients, repeats, warmup) -> dict:
+    try:
+        call, rows, teardown = setup(patients)
+    except Skip as e:
+        return {'skipped': str(e)}
+    except ImportError as e:
+        return {'skipped': f"missing dependency: {e.name or e}"}
+    try:
+        for _ in range(warmup):
+            call()
+        timings = np.empty(repeats)
+        for i in range(repeats):
+            start = time.perf_counter()
+            call()
+            timings[i] = time.perf_counter() - start
+    finally:
+        if teardown is not None:
+            teardown()
+    timings *= 1000
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {'rows': rows, 'repeats': repeats, 'mean_ms': float(timings.mean()), 'p50_ms': float(p50),
+            'p95_ms': float(p95), 'p99_ms': float(p99), 'rows_per_sec': float(rows / (p50 / 1000))}
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noise_ms: float = 0.05) -> list[dict]:
+    """p50 of every benchmark present in both runs against the baseline; regression beyond tolerance (and noise)."""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        if 'p50_ms' not in result or 'p50_ms' not in base:
+            continue
+        ratio = result['p50_ms'] / base['p50_ms'] if base['p50_ms'] > 0 else float('inf')
+        regressed = ratio > 1 + tolerance and result['p50_ms'] - base['p50_ms'] > noise_ms
+        rows.append({'benchmark': name, 'baseline_p50_ms': base['p50_ms'], 'p50_ms': result['p50_ms'],
+                     'ratio': ratio, 'regressed': regressed})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Triage inference micro-benchmarks")
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="write this run to --baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative p50 slowdown")
+    args = parser.parse_args()
+
+    patients = synthetic_patients(max(BATCH_ROWS, 1), seed=args.seed)
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = run_benchmark(BENCHMARKS[name], patients, args.repeats, args.warmup)
+        r = results[name]
+        if 'skipped' in r:
+            print(f"{name:<30} skipped ({r['skipped']})")
+        else:
+            print(f"{name:<30} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms  p99 {r['p99_ms']:9.3f} ms  ({r['rows']} rows)")
+
+    report = {
+        'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                 'repeats': args.repeats, 'seed': args.seed},
+        'results': results,
+    }
+    target = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    with open(target, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {target}")
+
+    if args.save_baseline:
+        return
+    if not os.path.exists(args.baseline):
+        # A missing baseline must not look like a passing regression check
+        print(f"WARNING: baseline {args.baseline} not found, nothing was compared; "
+              f"record one with: python -m benchmarks.run --save-baseline")
+        raise SystemExit(2)
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    comparison = compare(results, baseline, args.tolerance)
+    for row in comparison:
+        flag = "REGRESSION" if row['regressed'] else "ok"
+        print(f"{row['benchmark']:<30} {row['baseline_p50_ms']:9.3f} -> {row['p50_ms']:9.3f} ms  x{row['ratio']:.2f}  {flag}")
+    if any(row['regressed'] for row in comparison):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
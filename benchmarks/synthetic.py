@@ -0,0 +1,83 @@
+# Synthetic ED visits and a stand-in text encoder for benchmarks
+# ---------------------------------------------------
+# Patients follow the NUM_COLS layout used by both apps with plausible vital
+# ranges, a few missing values and Thai/English chief complaints. HashEncoder
+# replaces the TF-Hub USE model: deterministic, offline, same call signature
+# (list of strings -> [n, dim] float32) and unit-norm output like USE.
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from src.triage import NUM_COLS, TEXT_COLS, TARGETS
+
+
+COMPLAINTS_EN = [
+    "chest pain", "shortness of breath", "fever and cough", "abdominal pain", "headache",
+    "motorcycle accident with leg wound", "dizziness", "vomiting and diarrhea", "fall from height",
+    "syncope", "back pain", "seizure", "dog bite on hand", "palpitations", "weakness of left arm",
+]
+COMPLAINTS_TH = [
+    "เจ็บหน้าอก", "หายใจเหนื่อยหอบ", "ไข้ ไอ", "ปวดท้อง", "ปวดศีรษะ",
+    "อุบัติเหตุรถจักรยานยนต์ แผลที่ขา", "เวียนศีรษะ", "อาเจียน ถ่ายเหลว", "ตกจากที่สูง",
+    "หมดสติชั่วขณะ", "ปวดหลัง", "ชัก", "สุนัขกัดที่มือ", "ใจสั่น", "แขนซ้ายอ่อนแรง",
+]
+MODIFIERS = ["", " 2 hours", " since yesterday", " 3 วัน", " รุนแรง", " after meal"]
+
+
+def synthetic_complaints(n: int, seed: int = 0, thai_fraction: float = 0.6) -> list[str]:
+    rng = np.random.default_rng(seed)
+    thai = rng.random(n) < thai_fraction
+    base = [COMPLAINTS_TH[rng.integers(len(COMPLAINTS_TH))] if t else COMPLAINTS_EN[rng.integers(len(COMPLAINTS_EN))]
+            for t in thai]
+    return [b + MODIFIERS[rng.integers(len(MODIFIERS))] for b in base]
+
+
+def synthetic_patients(n: int, seed: int = 0, missing_rate: float = 0.02, with_targets: bool = False) -> pd.DataFrame:
+    """n visits with NUM_COLS + TEXT_COLS (and TARGETS when with_targets) in the apps' model tokens."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'age': rng.integers(15, 95, n).astype(float),
+        'sbp': rng.normal(130, 25, n).round().clip(50, 240),
+        'dbp': rng.normal(80, 15, n).round().clip(30, 150),
+        'temp': rng.normal(37.2, 0.8, n).round(1).clip(34.0, 42.0),
+        'pr': rng.normal(92, 20, n).round().clip(30, 200),
+        'rr': rng.normal(20, 4, n).round().clip(8, 50),
+        'o2sat': (100 - rng.gamma(1.5, 2.0, n)).round().clip(60, 100),
+        'gcs_e': rng.choice([1, 2, 3, 4], n, p=[.03, .03, .04, .90]).astype(float),
+        'gcs_v': rng.choice([1, 2, 3, 4, 5], n, p=[.03, .02, .03, .04, .88]).astype(float),
+        'gcs_m': rng.choice([1, 2, 3, 4, 5, 6], n, p=[.02, .01, .01, .02, .04, .90]).astype(float),
+        'sex': rng.choice(['ช', 'ญ'], n),
+        'how_come_er': rng.choice(['Walkin', 'EMS', 'Refer'], n, p=[.6, .3, .1]),
+        't_n': rng.choice(['N', 'T'], n, p=[.75, .25]),
+    })
+    # Sprinkle missing vitals like real registration data
+    for col in ['sbp', 'dbp', 'temp', 'pr', 'rr', 'o2sat']:
+        df.loc[rng.random(n) < missing_rate, col] = np.nan
+    df[TEXT_COLS[0]] = synthetic_complaints(n, seed=seed + 1)
+    if with_targets:
+        for t in TARGETS:
+            df[t] = (rng.random(n) < 0.15).astype(int)
+    return df[NUM_COLS + TEXT_COLS + (TARGETS if with_targets else [])]
+
+
+class HashEncoder:
+    """Deterministic offline stand-in for the USE encoder: hashed character trigrams -> unit vector."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        padded = f"  {text.casefold()} "
+        for i in range(len(padded) - 2):
+            h = int.from_bytes(hashlib.blake2b(padded[i:i + 3].encode('utf-8'), digest_size=8).digest(), 'little')
+            vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def __call__(self, texts) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        return np.stack([self._vector(str(t)) for t in texts]) if len(texts) else np.empty((0, self.dim), np.float32)
@@ -189,9 +189,9 @@ class TextEmbedder(BaseEstimator, TransformerMixin):
         assert embedder_url is not None, "embedder_url must be set"
         self.embedder_url = embedder_url
         self.embedder = None
-        self._load_model()
 
     def _load_model(self):
+        # Deferred until the first transform so constructing DataPreprocessing never downloads the encoder
         if self.embedder is None:
             self.embedder = hub.load(self.embedder_url)
 
@@ -199,6 +199,7 @@ class TextEmbedder(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
+        self._load_model()
         embeddings = []
         for text in X:
             embeddings.append(self.embedder(str(text)))
@@ -0,0 +1,113 @@
+# Indexed prediction audit store
+# ---------------------------------------------------
+# Logged predictions are also kept in a local SQLite database (WAL, safe for
+# several Streamlit workers) with the audit filters as indexed columns, so
+# questions like "all Level 1 calls last night" or "ICU risk > 0.5 from EMS
+# arrivals" are index lookups instead of scans. The full logged row is stored
+# as JSON alongside. Fed by PredictionLogWriter through its sinks.
+
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+
+DEFAULT_AUDIT_PATH = os.path.join("logs", "audit.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    session TEXT,
+    triage_level INTEGER,
+    arrival TEXT,
+    pred_icu REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_level ON predictions (triage_level, timestamp, pred_icu);
+CREATE INDEX IF NOT EXISTS idx_predictions_session ON predictions (session, timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_arrival ON predictions (arrival, timestamp, pred_icu);
+CREATE INDEX IF NOT EXISTS idx_predictions_icu ON predictions (pred_icu, timestamp);
+"""
+
+
+class AuditStore:
+    def __init__(self, path=DEFAULT_AUDIT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def insert_many(self, rows: list[dict]):
+        """Insert logged rows (as written by the apps' write_log); usable as a PredictionLogWriter sink."""
+        records = [(
+            str(row.get('timestamp')),
+            row.get('session'),
+            None if row.get('triage_level') is None else int(row['triage_level']),
+            row.get('how_come_er'),
+            # app2 logs pred_icu_admission, app.py logs pred_icu
+            row.get('pred_icu_admission', row.get('pred_icu')),
+            json.dumps(row, ensure_ascii=False, default=str),
+        ) for row in rows]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO predictions (timestamp, session, triage_level, arrival, pred_icu, data) VALUES (?, ?, ?, ?, ?, ?)",
+                records)
+            self._conn.execute("COMMIT")
+
+    def _where(self, start=None, end=None, levels=None, session=None, arrival=None, min_icu=None):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(str(end))
+        if levels:
+            clauses.append(f"triage_level IN ({', '.join('?' * len(levels))})")
+            params.extend(int(level) for level in levels)
+        if session is not None:
+            clauses.append("session = ?")
+            params.append(session)
+        if arrival is not None:
+            clauses.append("arrival = ?")
+            params.append(arrival)
+        if min_icu is not None:
+            clauses.append("pred_icu > ?")
+            params.append(float(min_icu))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM predictions{where}", params).fetchone()[0]
+
+    def query(self, limit=50, offset=0, newest_first=True, **filters) -> pd.DataFrame:
+        """One page of logged rows matching filters (start/end are ISO timestamps, end exclusive).
+
+        filters: start, end, levels (iterable of ints), session, arrival ('EMS', 'Walkin', ...), min_icu.
+        """
+        where, params = self._where(**filters)
+        order = "DESC" if newest_first else "ASC"
+        # With column filters, pick the page from the (covering) filter index and sort only the matching
+        # (timestamp, id) pairs; "+timestamp" keeps SQLite from walking the timestamp index instead
+        sort_key = "+timestamp" if set(k for k, v in filters.items() if v is not None) - {'start', 'end'} else "timestamp"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data FROM predictions WHERE id IN ("
+                f"SELECT id FROM predictions{where} ORDER BY {sort_key} {order}, id {order} LIMIT ? OFFSET ?"
+                f") ORDER BY timestamp {order}, id {order}",
+                params + [int(limit), int(offset)]).fetchall()
+        return pd.DataFrame([{'id': row_id, **json.loads(data)} for row_id, data in rows])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
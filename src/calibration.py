@@ -0,0 +1,188 @@
+# Probability calibration as monotone lookup tables
+# ---------------------------------------------------
+# Fitted calibrators (isotonic regression, Platt / sigmoid) are reduced to a
+# sorted table of knots and applied with np.interp, so inference needs neither
+# sklearn nor per-call validation. Isotonic calibrators are piecewise linear
+# already and are copied exactly; smooth maps are tabulated on a dense grid.
+# CalibrationTable holds one lookup per output (the 9 TARGETS of the Keras
+# model) and applies all of them in a single np.interp call. A saved table
+# carries a fingerprint of the model / weights files it was fitted for, so it
+# is never applied to the outputs of a different model.
+
+import hashlib
+import os
+
+import joblib
+import numpy as np
+
+
+class MonotoneLookup:
+    """Non-decreasing piecewise-linear map x -> y, clipped to the end knots like IsotonicRegression(out_of_bounds='clip')."""
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=np.float64).reshape(-1)
+        self.y = np.asarray(y, dtype=np.float64).reshape(-1)
+        assert len(self.x) == len(self.y) and len(self.x) > 0, "need the same number (> 0) of x and y knots"
+        assert np.all(np.diff(self.x) >= 0), "x knots must be sorted"
+
+    def __call__(self, values) -> np.ndarray:
+        return np.interp(np.asarray(values, dtype=np.float64), self.x, self.y)
+
+    @classmethod
+    def identity(cls):
+        return cls([0.0, 1.0], [0.0, 1.0])
+
+    @classmethod
+    def from_isotonic(cls, isotonic):
+        """Exact copy of a fitted sklearn IsotonicRegression."""
+        return cls(isotonic.X_thresholds_, isotonic.y_thresholds_)
+
+    @classmethod
+    def from_function(cls, fn, lo=0.0, hi=1.0, n_knots=4097, x=None):
+        """Tabulate fn on n_knots evenly spaced points of [lo, hi], or on the given sorted x."""
+        x = np.linspace(lo, hi, n_knots) if x is None else np.asarray(x, dtype=np.float64)
+        return cls(x, fn(x))
+
+    @classmethod
+    def from_sigmoid(cls, a, b, lo=0.0, hi=1.0, n_knots=4097):
+        """Platt scaling 1 / (1 + exp(a * f + b)) as in sklearn's _SigmoidCalibration, tabulated over [lo, hi]."""
+        return cls.from_function(lambda f: 1.0 / (1.0 + np.exp(a * f + b)), lo, hi, n_knots)
+
+    @classmethod
+    def from_calibrator(cls, calibrator, lo=0.0, hi=1.0, n_knots=4097):
+        """IsotonicRegression exactly, _SigmoidCalibration (a_, b_) tabulated; anything else via its predict()."""
+        if hasattr(calibrator, 'X_thresholds_'):
+            return cls.from_isotonic(calibrator)
+        if hasattr(calibrator, 'a_') and hasattr(calibrator, 'b_'):
+            return cls.from_sigmoid(float(calibrator.a_), float(calibrator.b_), lo, hi, n_knots)
+        return cls.from_function(calibrator.predict, lo, hi, n_knots)
+
+    def to_dict(self) -> dict:
+        return {'x': self.x, 'y': self.y}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d['x'], d['y'])
+
+    def max_error(self, fn, values) -> float:
+        """Largest absolute difference to the reference calibrator fn over values."""
+        values = np.asarray(values, dtype=np.float64)
+        return float(np.max(np.abs(self(values) - np.asarray(fn(values), dtype=np.float64)))) if values.size else 0.0
+
+
+def probability_grid(n_knots=2049, max_logit=12.0) -> np.ndarray:
+    """Knots in [0, 1] evenly spaced in logit space (dense near 0 and 1, where rare-outcome risks live)."""
+    inner = 1.0 / (1.0 + np.exp(-np.linspace(-max_logit, max_logit, n_knots - 2)))
+    return np.concatenate([[0.0], inner, [1.0]])
+
+
+def _logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), 1e-7, 1 - 1e-7)
+    return np.log(p / (1 - p))
+
+
+def fit_lookup(y_true, y_prob, method='isotonic', n_knots=2049) -> MonotoneLookup:
+    """Calibration map for one binary output: isotonic regression, or Platt scaling on the logit of y_prob."""
+    from sklearn.isotonic import IsotonicRegression
+    from sklearn.linear_model import LogisticRegression
+
+    y_true = np.asarray(y_true, dtype=np.float64).reshape(-1)
+    y_prob = np.asarray(y_prob, dtype=np.float64).reshape(-1)
+    keep = ~np.isnan(y_true)
+    y_true, y_prob = y_true[keep], y_prob[keep]
+    if len(np.unique(y_true)) < 2:
+        # Nothing to learn from a single class; leave the output as it is
+        return MonotoneLookup.identity()
+    if method == 'isotonic':
+        return MonotoneLookup.from_isotonic(IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip').fit(y_prob, y_true))
+    if method == 'sigmoid':
+        lr = LogisticRegression(C=1e6).fit(_logit(y_prob).reshape(-1, 1), y_true.astype(int))
+        a, b = float(lr.coef_[0, 0]), float(lr.intercept_[0])
+        if a <= 0:
+            # A non-increasing fit would reorder patients; keep the model's own ranking
+            return MonotoneLookup.identity()
+        return MonotoneLookup.from_function(lambda p: 1.0 / (1.0 + np.exp(-(a * _logit(p) + b))), x=probability_grid(n_knots))
+    raise ValueError(f"unknown calibration method {method!r} (use 'isotonic' or 'sigmoid')")
+
+
+class CalibrationMismatch(ValueError):
+    pass
+
+
+def model_fingerprint(*paths) -> str:
+    """sha256 over the bytes of the given model files (missing or None paths are skipped, like optional weights)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class CalibrationTable:
+    """One MonotoneLookup per output column, applied to [n, n_outputs] probabilities in one np.interp call."""
+
+    def __init__(self, targets, lookups, method=None, fingerprint=None):
+        assert len(targets) == len(lookups), "need one lookup per target"
+        self.targets = list(targets)
+        self.lookups = list(lookups)
+        self.method = method
+        self.fingerprint = fingerprint  # model_fingerprint() of the model files the table was fitted for
+
+        # Column j's knots are shifted by j * span so all tables live on one increasing axis;
+        # inputs are clipped to their own table's range first, so tables never interpolate into each other
+        self._lo = np.array([lookup.x[0] for lookup in self.lookups])
+        self._hi = np.array([lookup.x[-1] for lookup in self.lookups])
+        span = (self._hi.max() - self._lo.min()) + 1.0 if self.lookups else 1.0
+        self._offsets = np.arange(len(self.lookups)) * span
+        self._x = np.concatenate([lookup.x + offset for lookup, offset in zip(self.lookups, self._offsets)]) \
+            if self.lookups else np.empty(0)
+        self._y = np.concatenate([lookup.y for lookup in self.lookups]) if self.lookups else np.empty(0)
+
+    def __call__(self, probs) -> np.ndarray:
+        probs = np.asarray(probs)
+        flat = probs.reshape(-1, len(self.targets)).astype(np.float64)
+        shifted = np.clip(flat, self._lo, self._hi) + self._offsets
+        out = np.interp(shifted, self._x, self._y)
+        return out.astype(probs.dtype if probs.dtype.kind == 'f' else np.float64, copy=False).reshape(probs.shape)
+
+    @classmethod
+    def fit(cls, y_true, y_prob, targets, method='isotonic', n_knots=2049):
+        """Fit one calibrator per column of y_true / y_prob (validation labels and model outputs)."""
+        y_true, y_prob = np.asarray(y_true), np.asarray(y_prob)
+        assert y_true.shape == y_prob.shape and y_prob.shape[1] == len(targets), \
+            f"labels {y_true.shape} and probabilities {y_prob.shape} must both be [n, {len(targets)}]"
+        return cls(targets, [fit_lookup(y_true[:, j], y_prob[:, j], method, n_knots) for j in range(len(targets))], method)
+
+    def save(self, path, fingerprint=None):
+        """Write the table; fingerprint (model_fingerprint of the saved model files) replaces the stored one."""
+        if fingerprint is not None:
+            self.fingerprint = fingerprint
+        joblib.dump({'targets': self.targets, 'method': self.method, 'fingerprint': self.fingerprint,
+                     'lookups': [lookup.to_dict() for lookup in self.lookups]}, path)
+
+    @classmethod
+    def load(cls, path):
+        d = joblib.load(path)
+        return cls(d['targets'], [MonotoneLookup.from_dict(lookup) for lookup in d['lookups']], d.get('method'),
+                   d.get('fingerprint'))
+
+    def check(self, targets, fingerprint):
+        """Raise CalibrationMismatch unless the table covers targets and was fitted for the model with fingerprint."""
+        if self.targets != list(targets):
+            raise CalibrationMismatch(f"calibration targets {self.targets} do not match {list(targets)}")
+        if self.fingerprint is None:
+            raise CalibrationMismatch("calibration table has no model fingerprint; re-save it with TriageModel.save_model()")
+        if self.fingerprint != fingerprint:
+            raise CalibrationMismatch(f"calibration table was fitted for another model "
+                                      f"(fingerprint {self.fingerprint[:12]}, model files {fingerprint[:12]})")
+
+
+def brier_scores(y_true, y_prob) -> np.ndarray:
+    """Per-column Brier score, ignoring missing labels."""
+    y_true, y_prob = np.asarray(y_true, dtype=np.float64), np.asarray(y_prob, dtype=np.float64)
+    sq = np.where(np.isnan(y_true), np.nan, (y_prob - y_true) ** 2)
+    return np.nanmean(sq, axis=0)
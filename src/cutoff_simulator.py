@@ -0,0 +1,105 @@
+# Cutoff-sweep simulator
+# ---------------------------------------------------
+# Re-triages a set of logged predictions under thousands of candidate cutoff
+# sets at once (the triage_levels rules broadcast over a [combos, patients]
+# grid) and reports the resulting level distribution and, when outcomes are
+# known, over/under-triage:
+#   under-triage: patients with a critical outcome (ICU, OR, ET, 7-day death)
+#                 assigned Level 3-5
+#   over-triage:  patients without one assigned Level 1-2
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from src.triage import CRITICAL_TARGETS, DEFAULT_RED_FLAGS, risk_groups, vital_red_flags_mask
+
+
+def cutoff_grid(lvl1=(0.30, 0.70, 0.05), lvl2=(0.10, 0.50, 0.05), lvl3=(0.20, 0.60, 0.05), lvl4=(0.10, 0.50, 0.05),
+                ordered=True) -> pd.DataFrame:
+    """All combinations of (start, stop, step) ranges; ordered drops sets where lvl2 > lvl1 (Level 2 unreachable)."""
+    axes = [np.round(np.arange(start, stop + step / 2, step), 4) for start, stop, step in (lvl1, lvl2, lvl3, lvl4)]
+    grid = pd.DataFrame(list(itertools.product(*axes)), columns=['lvl1', 'lvl2', 'lvl3', 'lvl4'])
+    if ordered:
+        grid = grid[grid['lvl2'] <= grid['lvl1']].reset_index(drop=True)
+    return grid
+
+
+def critical_outcome(outcomes) -> np.ndarray:
+    """Boolean per patient: any observed critical outcome column (CRITICAL_TARGETS) is positive."""
+    if isinstance(outcomes, np.ndarray) and outcomes.ndim == 1:
+        return outcomes.astype(bool)
+    present = [t for t in CRITICAL_TARGETS if t in outcomes]
+    assert present, f"outcomes need at least one of {CRITICAL_TARGETS}"
+    return np.column_stack([np.nan_to_num(np.asarray(outcomes[t], dtype=np.float64)) > 0 for t in present]).any(axis=1)
+
+
+def _level_counts(critical, urgent, minor, cuts) -> np.ndarray:
+    """[k, 5] Level 1-5 counts of (non-red-flag) patients for k cutoff sets, via cumulative histograms.
+
+    Level 1: critical >= c1; Level 2: c2 <= critical < c1; Level 3: critical < min(c1, c2) and urgent >= c3;
+    Level 4: additionally urgent < c3 and minor >= c4; Level 5: the rest. Thresholds are bucketed on the
+    distinct cutoff values, so the cost is O(patients + cutoff sets) instead of their product.
+    """
+    c1, c2, c3, c4 = cuts.T
+    n = len(critical)
+    counts = np.zeros((len(cuts), 5), dtype=np.int64)
+    if n == 0:
+        return counts
+
+    # #{critical >= c} for any c
+    sorted_critical = np.sort(critical)
+    at_least = lambda c: n - np.searchsorted(sorted_critical, c, side='left')
+    counts[:, 0] = at_least(c1)
+    counts[:, 1] = np.where(c2 < c1, at_least(c2) - at_least(c1), 0)
+
+    # Bucket b(x) = number of axis thresholds <= x, so x >= axis[j] <=> b(x) > j
+    crit_axis, cmin = np.unique(np.minimum(c1, c2), return_inverse=True)
+    urg_axis, j3 = np.unique(c3, return_inverse=True)
+    min_axis, j4 = np.unique(c4, return_inverse=True)
+    b2 = np.searchsorted(crit_axis, critical, side='right')
+    b3 = np.searchsorted(urg_axis, urgent, side='right')
+    b4 = np.searchsorted(min_axis, minor, side='right')
+
+    shape = (len(crit_axis) + 1, len(urg_axis) + 1, len(min_axis) + 1)
+    hist = np.bincount(np.ravel_multi_index((b2, b3, b4), shape), minlength=np.prod(shape)).reshape(shape)
+    # below[a, ...]: critical < crit_axis[a]  (b2 <= a)
+    below = np.cumsum(hist, axis=0)
+    # Level 3: b2 <= cmin, b3 > j3
+    urgent_at_least = np.flip(np.cumsum(np.flip(below.sum(axis=2), axis=1), axis=1), axis=1)
+    counts[:, 2] = urgent_at_least[cmin, j3 + 1]
+    # Level 4: b2 <= cmin, b3 <= j3, b4 > j4
+    minor_at_least = np.flip(np.cumsum(np.flip(np.cumsum(below, axis=1), axis=2), axis=2), axis=2)
+    counts[:, 3] = minor_at_least[cmin, j3, j4 + 1]
+    counts[:, 4] = n - counts[:, :4].sum(axis=1)
+    return counts
+
+
+def simulate(preds, vitals, grid: pd.DataFrame, red_flags: dict = DEFAULT_RED_FLAGS, apply_redflags: bool = True,
+             outcomes=None) -> pd.DataFrame:
+    """One row per cutoff set in grid: level_1..level_5 shares and, with outcomes, under_/over_triage rates.
+
+    preds / vitals / outcomes: DataFrames (or dicts of columns) over the same patients.
+    """
+    critical, urgent, minor = risk_groups(preds)
+    n = len(critical)
+    flagged = vital_red_flags_mask(vitals, red_flags) if apply_redflags else np.zeros(n, dtype=bool)
+    severe = critical_outcome(outcomes) if outcomes is not None else np.zeros(n, dtype=bool)
+    cuts = grid[['lvl1', 'lvl2', 'lvl3', 'lvl4']].to_numpy(np.float64)
+
+    # Red-flag patients are Level 1 under every cutoff set; the rest are counted per group
+    counts = {}
+    for name, group in (('severe', severe), ('other', ~severe)):
+        keep = group & ~flagged
+        counts[name] = _level_counts(critical[keep], urgent[keep], minor[keep], cuts)
+        counts[name][:, 0] += int((group & flagged).sum())
+    total = counts['severe'] + counts['other']
+
+    result = grid[['lvl1', 'lvl2', 'lvl3', 'lvl4']].reset_index(drop=True).copy()
+    for level in range(1, 6):
+        result[f'level_{level}'] = total[:, level - 1] / max(n, 1)
+    if outcomes is not None:
+        result['under_triage'] = counts['severe'][:, 2:].sum(axis=1) / max(int(severe.sum()), 1)
+        result['over_triage'] = counts['other'][:, :2].sum(axis=1) / max(int((~severe).sum()), 1)
+    return result
@@ -0,0 +1,163 @@
+# Direct NumPy feature path for the calibrated XGBoost pipeline
+# ---------------------------------------------------
+# app.py used to build a 13 + 512 column DataFrame per request only for the
+# sklearn ColumnTransformer to validate and re-select those columns by name.
+# DirectFeaturePredictor resolves the ColumnTransformer's column plan once at
+# load time and then feeds each fitted sub-transformer slices of preallocated
+# buffers (contiguous float32 for the embedding, float64 for vitals - float32
+# overflows in Yeo-Johnson at large lambdas - and object for categories),
+# followed by the remaining pipeline steps and predict_proba of the final
+# estimator. Pipelines it cannot mirror exactly raise UnsupportedPipeline, and
+# direct_predictor() checks parity on a sample before it is used, so callers
+# fall back to model.predict_proba(DataFrame) otherwise.
+
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+class UnsupportedPipeline(ValueError):
+    pass
+
+
+def _locate_column_transformer(model):
+    """(column transformer, steps applied after it, final estimator) of a (nested) fitted Pipeline."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+
+    if not isinstance(model, Pipeline):
+        raise UnsupportedPipeline(f"expected a Pipeline, got {type(model).__name__}")
+    after = []
+    node = model
+    while True:
+        steps = [est for _, est in node.steps if est not in (None, 'passthrough')]
+        head, rest = steps[0], steps[1:]
+        after = rest + after
+        if isinstance(head, ColumnTransformer):
+            break
+        if not isinstance(head, Pipeline):
+            raise UnsupportedPipeline(f"first step is {type(head).__name__}, not a ColumnTransformer")
+        node = head
+    if not after or not hasattr(after[-1], 'predict_proba'):
+        raise UnsupportedPipeline("pipeline does not end in a classifier with predict_proba")
+    return head, after[:-1], after[-1]
+
+
+def _as_index(positions):
+    """A slice (view, no copy) when positions are consecutive, else the index array."""
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+        return slice(int(positions[0]), int(positions[0]) + len(positions))
+    return positions
+
+
+class DirectFeaturePredictor:
+    def __init__(self, model, input_cols, text_cols, categorical_cols=()):
+        self.model = model
+        self.input_cols = list(input_cols)
+        self.text_cols = list(text_cols)
+        self.ct, self.post_steps, self.estimator = _locate_column_transformer(model)
+
+        ct = self.ct
+        if getattr(ct, 'sparse_output_', False):
+            raise UnsupportedPipeline("ColumnTransformer produces sparse output")
+        if getattr(ct, '_sklearn_output_config', {}).get('transform') not in (None, 'default'):
+            raise UnsupportedPipeline("ColumnTransformer is configured for pandas output")
+        expected = list(getattr(ct, 'feature_names_in_', []))
+        missing = [c for c in expected if c not in self.input_cols + self.text_cols]
+        if not expected or missing:
+            raise UnsupportedPipeline(f"pipeline columns not provided: {missing or 'no feature names'}")
+
+        # Buffers hold the expected columns in the pipeline's own order, split by kind
+        categorical, text = set(categorical_cols), set(self.text_cols)
+        self.columns = {
+            'n': [c for c in expected if c not in categorical and c not in text],
+            't': [c for c in expected if c in text],
+            'o': [c for c in expected if c in categorical],
+        }
+        position = {c: (kind, i) for kind, cols in self.columns.items() for i, c in enumerate(cols)}
+
+        # Where each value passed to predict_proba goes (None: column unused by the pipeline)
+        self._slots = [position.get(c) for c in self.input_cols]
+        if any(position[c][0] != 't' for c in self.text_cols):
+            raise UnsupportedPipeline("text columns cannot be categorical")
+        self._text_index = _as_index([position[c][1] for c in self.text_cols])
+
+        # (kind, index, transformer) per ColumnTransformer block, in output order
+        input_indices = getattr(ct, '_transformer_to_input_indices', None)
+        if input_indices is None:
+            raise UnsupportedPipeline("ColumnTransformer has no resolved input indices (scikit-learn < 1.2)")
+        self._blocks = []
+        for name, transformer, _ in ct.transformers_:
+            indices = input_indices.get(name, [])
+            if transformer == 'drop' or len(indices) == 0:
+                continue
+            kinds = {position[expected[i]][0] for i in indices}
+            if len(kinds) > 1:
+                raise UnsupportedPipeline(f"block {name!r} mixes vitals, text and categorical columns")
+            self._blocks.append((kinds.pop(), _as_index([position[expected[i]][1] for i in indices]), transformer))
+
+        self._local = threading.local()
+
+    def _buffers(self):
+        # One pair of buffers per thread (Streamlit serves sessions from several threads)
+        local = self._local
+        if not hasattr(local, 'buffers'):
+            local.buffers = {
+                'n': np.zeros((1, len(self.columns['n'])), dtype=np.float64),
+                't': np.zeros((1, len(self.columns['t'])), dtype=np.float32),
+                'o': np.empty((1, len(self.columns['o'])), dtype=object),
+            }
+        return local.buffers
+
+    def predict_proba(self, values, text_vec) -> np.ndarray:
+        """values: one patient in input_cols order; text_vec: its embedding in text_cols order."""
+        buffers = self._buffers()
+        for slot, value in zip(self._slots, values):
+            if slot is None:
+                continue
+            kind, pos = slot
+            buffers[kind][0, pos] = np.nan if value is None and kind != 'o' else value
+        buffers['t'][0, self._text_index] = np.asarray(text_vec, dtype=np.float32).reshape(-1)
+
+        outputs = []
+        with warnings.catch_warnings():
+            # Sub-transformers were fitted on DataFrame slices; the arrays here are in the same column order
+            warnings.filterwarnings('ignore', message="X does not have valid feature names")
+            for kind, index, transformer in self._blocks:
+                block = buffers[kind][:, index]
+                out = block if transformer == 'passthrough' else transformer.transform(block)
+                outputs.append(out.toarray() if sp.issparse(out) else np.asarray(out))
+        X = np.hstack(outputs)
+        for step in self.post_steps:
+            X = step.transform(X)
+        return self.estimator.predict_proba(X)
+
+    def check(self, frame: pd.DataFrame) -> float:
+        """Largest absolute difference to model.predict_proba over the rows of frame, one row at a time like the app."""
+        diffs = [0.0]
+        for i in range(len(frame)):
+            row = frame.iloc[[i]]
+            expected = self.model.predict_proba(row)
+            got = self.predict_proba(row[self.input_cols].iloc[0].tolist(), row[self.text_cols].to_numpy(np.float32))
+            diffs.append(float(np.max(np.abs(got - expected))))
+        return max(diffs)
+
+
+def direct_predictor(model, input_cols, text_cols, categorical_cols=(), sample: pd.DataFrame = None, atol=1e-4):
+    """DirectFeaturePredictor for model, or None when the pipeline is unsupported, fails, or differs on sample."""
+    try:
+        predictor = DirectFeaturePredictor(model, input_cols, text_cols, categorical_cols)
+        if sample is not None:
+            diff = predictor.check(sample)
+            if not diff <= atol:
+                raise UnsupportedPipeline(f"differs from predict_proba by {diff:.2e}")
+    except Exception as e:
+        # Anything that goes wrong here (unsupported layout, a KeyError/IndexError from an unexpected
+        # column plan, a transformer failing on the probe) only disables the fast path, never the loader
+        print(f"Direct feature path disabled, using predict_proba on DataFrames: {type(e).__name__}: {e}")
+        return None
+    return predictor
@@ -0,0 +1,132 @@
+# Persistent chief-complaint embedding cache
+# ---------------------------------------------------
+# Chief complaints repeat heavily, so encoder outputs are cached on disk in a
+# SQLite file (safe for several Streamlit worker processes) with a bounded
+# in-memory LRU in front. Keys combine the normalized text with the embedder
+# URL/version so a model swap never returns stale vectors. The encoder always
+# sees the original complaint (USE is case-sensitive and the models were trained
+# on raw text), so normalization is limited to what cannot change the embedding.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "embeddings.sqlite")
+
+
+def normalize_text(text) -> str:
+    """Cache-key form of a chief complaint: NFC and outer whitespace only, which the encoder ignores."""
+    return unicodedata.normalize("NFC", str(text)).strip()
+
+
+class EmbeddingCache:
+    def __init__(self, embedder_url, path=DEFAULT_CACHE_PATH, version="", max_memory_items=10000):
+        assert embedder_url is not None, "embedder_url must be set"
+        self.embedder_url = embedder_url
+        self.version = version
+        self.path = path
+        self.max_memory_items = max_memory_items
+
+        # "n2": keys on NFC + strip only ("n1" entries were encoded from casefolded text)
+        self._namespace = f"{embedder_url}|{version}|n2"
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # WAL lets readers in other processes proceed while one process writes
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)")
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text) -> str:
+        return hashlib.sha1(f"{self._namespace}|{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts) -> dict:
+        """Return {key: vector} for every text already cached (memory first, then disk)."""
+        return self._get_keys({self.key(t) for t in texts})
+
+    def _get_keys(self, keys) -> dict:
+        found = {}
+        with self._lock:
+            for k in keys:
+                if k in self._memory:
+                    self._memory.move_to_end(k)
+                    found[k] = self._memory[k]
+
+            missing = [k for k in keys if k not in found]
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for k, dim, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                    self._remember(k, vector)
+                    found[k] = vector
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs in memory and on disk."""
+        rows = []
+        with self._lock:
+            for k, vector in items:
+                vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+                self._remember(k, vector)
+                rows.append((k, vector.shape[0], vector.tobytes()))
+            if rows:
+                self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows)
+
+    def embed(self, texts, encode, batch_size=None) -> np.ndarray:
+        """Embed texts as a float32 (n, dim) array, calling encode(list[str]) only for unseen texts.
+
+        encode receives the original texts; the cache key only ignores NFC form and outer whitespace.
+        With batch_size=None all unseen texts go to encode in one call (e.g. when encode batches itself).
+        """
+        texts = [str(t) for t in texts]
+        keys = [self.key(t) for t in texts]
+        found = self._get_keys(set(keys))
+
+        # Encode each distinct missing complaint once
+        pending = OrderedDict()
+        for k, t in zip(keys, texts):
+            if k not in found and k not in pending:
+                pending[k] = t
+        self.hits += len(texts) - sum(1 for k in keys if k in pending)
+        self.misses += len(pending)
+
+        pending_keys = list(pending)
+        batch_size = batch_size or max(len(pending_keys), 1)
+        for start in range(0, len(pending_keys), batch_size):
+            chunk_keys = pending_keys[start:start + batch_size]
+            vectors = np.asarray(encode([pending[k] for k in chunk_keys]), dtype=np.float32)
+            self.put_many(zip(chunk_keys, vectors))
+            found.update(zip(chunk_keys, vectors))
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        out = np.empty((len(texts), found[keys[0]].shape[-1]), dtype=np.float32)
+        for i, k in enumerate(keys):
+            out[i] = found[k]
+        return out
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,167 @@
+# Offline local store for the USE text encoder
+# ---------------------------------------------------
+# Maps the TF-Hub / Kaggle encoder URLs used across the project to extracted
+# SavedModel directories on local disk, so cold start never needs the network.
+#
+#   python -m src.encoder_store prefetch            # all known URLs
+#   python -m src.encoder_store prefetch URL [URL ...]
+#   python -m src.encoder_store verify              # full content-hash check
+#   python -m src.encoder_store list
+#
+# Prefetch records a SHA-256 over every file plus a cheap stat fingerprint
+# (relative path + size); loading checks the fingerprint, `verify` re-hashes.
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+
+DEFAULT_STORE_DIR = os.environ.get("TRIAGE_ENCODER_STORE", os.path.join("model", "encoders"))
+MANIFEST_NAME = "manifest.json"
+
+# Encoder URLs referenced by app.py, app2.py and src/source.py
+KNOWN_URLS = [
+    "https://www.kaggle.com/models/google/universal-sentence-encoder/TensorFlow2/multilingual/2",
+    "https://tfhub.dev/google/universal-sentence-encoder-multilingual-large/3",
+    "https://www.kaggle.com/models/google/universal-sentence-encoder/tensorFlow2/multilingual",
+]
+
+
+class EncoderStoreError(RuntimeError):
+    pass
+
+
+def _slug(url: str) -> str:
+    tail = re.sub(r"[^A-Za-z0-9]+", "-", url.split("://", 1)[-1]).strip("-").lower()[-60:]
+    return f"{tail}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _files(path: str) -> list[str]:
+    return sorted(os.path.relpath(os.path.join(root, name), path)
+                  for root, _, names in os.walk(path) for name in names)
+
+
+def stat_fingerprint(path: str) -> str:
+    """Cheap fingerprint of a directory: relative paths and sizes of every file."""
+    digest = hashlib.sha256()
+    for rel in _files(path):
+        digest.update(f"{rel}\0{os.path.getsize(os.path.join(path, rel))}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 over every file's relative path and bytes."""
+    digest = hashlib.sha256()
+    for rel in _files(path):
+        digest.update(rel.encode("utf-8") + b"\0")
+        with open(os.path.join(path, rel), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(store_dir: str = DEFAULT_STORE_DIR) -> dict:
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest: dict, store_dir: str):
+    os.makedirs(store_dir, exist_ok=True)
+    tmp = os.path.join(store_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(store_dir, MANIFEST_NAME))
+
+
+def prefetch(url: str, store_dir: str = DEFAULT_STORE_DIR) -> str:
+    """Download/extract the encoder via TF-Hub and copy it into the store; returns the local path."""
+    import tensorflow_hub as hub  # only needed when fetching
+
+    source = hub.resolve(url)
+    os.makedirs(store_dir, exist_ok=True)
+    target = os.path.join(store_dir, _slug(url))
+
+    # Copy next to the target first so a half-written directory is never picked up
+    staging = tempfile.mkdtemp(prefix=".fetch-", dir=store_dir)
+    try:
+        shutil.copytree(source, os.path.join(staging, "model"))
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.replace(os.path.join(staging, "model"), target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    manifest = load_manifest(store_dir)
+    manifest[url] = {
+        "path": os.path.basename(target),
+        "sha256": content_hash(target),
+        "fingerprint": stat_fingerprint(target),
+        "fetched": datetime.now().isoformat(timespec="seconds"),
+    }
+    _save_manifest(manifest, store_dir)
+    return target
+
+
+def verify(url: str, store_dir: str = DEFAULT_STORE_DIR, full: bool = True) -> str:
+    """Check the stored copy of url (full SHA-256, or only the stat fingerprint); returns its path."""
+    entry = load_manifest(store_dir).get(url)
+    if entry is None:
+        raise EncoderStoreError(f"{url} is not in the encoder store {store_dir}; run `python -m src.encoder_store prefetch {url}`")
+    path = os.path.join(store_dir, entry["path"])
+    if not os.path.isdir(path):
+        raise EncoderStoreError(f"stored encoder directory {path} is missing")
+    if stat_fingerprint(path) != entry["fingerprint"]:
+        raise EncoderStoreError(f"stored encoder {path} has changed since prefetch (file list or sizes differ)")
+    if full and content_hash(path) != entry["sha256"]:
+        raise EncoderStoreError(f"stored encoder {path} failed its SHA-256 check")
+    return path
+
+
+def resolve(url: str, store_dir: str = DEFAULT_STORE_DIR) -> str:
+    """Local SavedModel directory for url if it is in the store, else url itself (network fallback).
+
+    Set TRIAGE_ENCODER_OFFLINE=1 to fail instead of falling back to the network.
+    """
+    if os.path.isdir(url):
+        return url
+    if url in load_manifest(store_dir):
+        return verify(url, store_dir, full=False)
+    if os.environ.get("TRIAGE_ENCODER_OFFLINE") == "1":
+        raise EncoderStoreError(f"{url} is not in the encoder store {store_dir} and TRIAGE_ENCODER_OFFLINE=1")
+    return url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local text-encoder store")
+    parser.add_argument("command", choices=["prefetch", "verify", "list"])
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.store)
+    if args.command == "prefetch":
+        for url in args.urls or KNOWN_URLS:
+            print(f"{url}\n  -> {prefetch(url, args.store)}")
+    elif args.command == "verify":
+        failed = False
+        for url in args.urls or sorted(manifest):
+            try:
+                print(f"ok      {url}  ({verify(url, args.store)})")
+            except EncoderStoreError as e:
+                failed = True
+                print(f"FAILED  {url}: {e}")
+        raise SystemExit(1 if failed else 0)
+    else:
+        for url, entry in sorted(manifest.items()):
+            print(f"{url}\n  {entry['path']}  sha256={entry['sha256'][:12]}  fetched={entry['fetched']}")
+
+
+if __name__ == "__main__":
+    main()
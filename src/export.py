@@ -0,0 +1,45 @@
+# Export a fused serving artifact
+# ---------------------------------------------------
+# Folds the fitted numeric preprocessor into TF ops and bundles it with the USE
+# encoder and the Keras MLP as one SavedModel signature:
+#
+#   python -m src.export --output model/serving
+#
+# Serve it with:  python -m src.server --saved-model model/serving
+
+import argparse
+import os
+
+import joblib
+
+from src.source import DataPreprocessing, TriageModel
+from src.inference import DEFAULT_PATHS, DEFAULT_EMBEDDER_URL
+from src.triage import TARGETS, NUM_COLS, TEXT_COLS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export preprocessing + encoder + model as one SavedModel")
+    parser.add_argument('--num-preprocessor', default=DEFAULT_PATHS["num_preprocessor"])
+    parser.add_argument('--model', default=DEFAULT_PATHS["keras_model"])
+    parser.add_argument('--weights', default=DEFAULT_PATHS["keras_weights"])
+    parser.add_argument('--embedder-url', default=DEFAULT_EMBEDDER_URL)
+    parser.add_argument('--output', default="model/serving")
+    args = parser.parse_args()
+
+    preprocessor = DataPreprocessing()
+    preprocessor.num_preprocessor = joblib.load(args.num_preprocessor)
+    preprocessor.x_num_cols = NUM_COLS
+    preprocessor.x_text_cols = TEXT_COLS
+    preprocessor.y_cols = TARGETS
+
+    model = TriageModel()
+    model.import_model(args.model)
+    if args.weights and os.path.exists(args.weights):
+        model.load_weights(args.weights)
+
+    # The export records the fingerprint of exactly these files, so only their calibration table is applied to it
+    model.export_serving(args.output, preprocessor, args.embedder_url, model_files=(args.model, args.weights))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Memory-mapped feature store for retraining
+# ---------------------------------------------------
+# Preprocessed numeric features, text embeddings and targets of a split are
+# written once as float32 .npy files under a fingerprint of the data, the
+# fitted num_preprocessor and the encoder. Later runs with the same inputs load
+# them with mmap_mode='r' and skip preprocessing and embedding entirely.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.encoder_store import load_manifest
+
+
+DEFAULT_STORE_DIR = os.path.join("cache", "features")
+FORMAT_VERSION = 1
+ARRAYS = ("num", "text", "targets")
+
+
+def fingerprint(data: pd.DataFrame, preprocessor, embedder_url: str) -> str:
+    """Key for one split: row contents and column names, fitted preprocessor state and encoder identity."""
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}|{embedder_url}|".encode("utf-8"))
+    # A prefetched encoder is identified by its content hash, not only its URL
+    digest.update(load_manifest().get(embedder_url, {}).get("sha256", "").encode("utf-8"))
+    digest.update("|".join(map(str, data.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    digest.update(joblib.hash(preprocessor).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def has(self, key: str) -> bool:
+        # meta.json is written last, so its presence marks a complete entry
+        return os.path.exists(os.path.join(self.path(key), "meta.json"))
+
+    def save(self, key: str, num, text, targets, meta: dict = None):
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".write-", dir=self.root)
+        try:
+            shapes = {}
+            for name, array in zip(ARRAYS, (num, text, targets)):
+                array = np.ascontiguousarray(array, dtype=np.float32)
+                np.save(os.path.join(staging, f"{name}.npy"), array)
+                shapes[name] = list(array.shape)
+            with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"format": FORMAT_VERSION, "shapes": shapes, **(meta or {})}, f, indent=2)
+            if os.path.exists(self.path(key)):
+                shutil.rmtree(self.path(key))
+            os.replace(staging, self.path(key))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load(self, key: str) -> dict:
+        """Read-only memory-mapped arrays; slicing them does not copy."""
+        assert self.has(key), f"no features stored under {key}"
+        return {name: np.load(os.path.join(self.path(key), f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+
+    def get_or_compute(self, key: str, compute, meta: dict = None) -> dict:
+        """Load key if stored, otherwise compute() -> (num, text, targets), save it and load it back."""
+        if not self.has(key):
+            self.save(key, *compute(), meta=meta)
+        return self.load(key)
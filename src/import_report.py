@@ -0,0 +1,51 @@
+# Import-time report
+# ---------------------------------------------------
+# Imports the given modules in a fresh interpreter with `-X importtime` and
+# summarizes where startup time goes, grouped by top-level package:
+#
+#   python -m src.import_report                # src.source, src.inference
+#   python -m src.import_report src.server --top 15
+
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def import_times(modules) -> tuple[float, dict]:
+    """Return (total seconds, {top-level package: self seconds}) for importing modules."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")][-5:]
+        raise RuntimeError("import failed:\n" + "\n".join(tail))
+
+    per_package = defaultdict(float)
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+        # Nested imports are indented by two spaces per level; only count top-level cumulative time
+        if not name.startswith("  "):
+            total += int(cumulative_us) / 1e6
+    return total, dict(per_package)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report module import time by top-level package")
+    parser.add_argument("modules", nargs="*", default=["src.source", "src.inference"])
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    total, per_package = import_times(args.modules)
+    print(f"import {', '.join(args.modules)}: {total:.2f} s")
+    for name, seconds in sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {name:<28} {seconds:7.3f} s  {seconds / total * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
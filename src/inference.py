@@ -0,0 +1,349 @@
+# Inference pipeline for the multi-outcome Keras triage model
+# ---------------------------------------------------
+# Loads the numeric preprocessor, the USE text embedder and TriageModel once so
+# the Streamlit app and the HTTP service score patients through the same code.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import tensorflow as tf
+
+from src.source import DataPreprocessing, TriageModel, _lazy_import, _load_hub_model
+from src.embedding_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from src.calibration import CalibrationMismatch, CalibrationTable, model_fingerprint
+from src.triage import TARGETS, NUM_COLS, TEXT_COLS
+from src.metrics import METRICS
+
+
+DEFAULT_PATHS = {
+    "num_preprocessor": "model/num_preprocessor.joblib",
+    "keras_model": "model/model.keras",
+    "keras_weights": "model/weights.weights.h5",
+    "calibration": "model/calibration.joblib",  # optional, from TriageModel.calibrate() + save_model()
+}
+DEFAULT_EMBEDDER_URL = "https://www.kaggle.com/models/google/universal-sentence-encoder/TensorFlow2/multilingual/2"
+
+
+def _load_calibration(calibration_path, fingerprint):
+    """CalibrationTable for TARGETS, or None when there is no calibration file.
+
+    fingerprint is model_fingerprint() of the Keras files the table will be applied to (for a fused
+    SavedModel, the one recorded at export); a table saved for other files raises CalibrationMismatch.
+    """
+    if not calibration_path or not os.path.exists(calibration_path):
+        print(f"Calibration inactive: no table at {calibration_path!r}, serving raw model probabilities")
+        return None
+    if not fingerprint:
+        raise CalibrationMismatch(f"cannot check {calibration_path} against a model without a fingerprint "
+                                  f"(re-export the SavedModel with python -m src.export)")
+    calibration = CalibrationTable.load(calibration_path)
+    calibration.check(TARGETS, fingerprint)
+    print(f"Calibration active: {calibration.method} table from {calibration_path}")
+    return calibration
+
+
+class BackgroundLoader:
+    """Load named artifacts concurrently, run a warm-up over them, then report ready.
+
+    loaders maps a name to a zero-argument callable; warm_up(artifacts) runs after all of
+    them finished. With background=True this happens in a daemon thread and the caller
+    polls status / calls wait() instead of blocking at construction.
+    """
+
+    def __init__(self, loaders: dict, warm_up=None, background=True):
+        self.loaders = loaders
+        self.warm_up = warm_up
+        self.artifacts = {}
+        self.error = None
+        self.seconds = None
+        self.ready = threading.Event()
+
+        if background:
+            threading.Thread(target=self._run, name="triage-artifact-loader", daemon=True).start()
+        else:
+            self._run()
+            self.wait()
+
+    @property
+    def status(self) -> str:
+        if not self.ready.is_set():
+            return 'loading'
+        return 'failed' if self.error is not None else 'ready'
+
+    def wait(self, timeout=None) -> dict:
+        if not self.ready.wait(timeout):
+            raise TimeoutError("artifacts are still loading")
+        if self.error is not None:
+            raise self.error
+        return self.artifacts
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(self.loaders), 1), thread_name_prefix="triage-load") as pool:
+                futures = {name: pool.submit(fn) for name, fn in self.loaders.items()}
+                self.artifacts = {name: future.result() for name, future in futures.items()}
+            if self.warm_up is not None:
+                self.warm_up(self.artifacts)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.seconds = time.perf_counter() - start
+            self.ready.set()
+
+
+class TriagePipeline:
+    WARM_UP_COMPLAINT = "chest pain"
+
+    def __init__(self,
+                 num_preprocessor_path=DEFAULT_PATHS["num_preprocessor"],
+                 model_path=DEFAULT_PATHS["keras_model"],
+                 weights_path=DEFAULT_PATHS["keras_weights"],
+                 embedder_url=DEFAULT_EMBEDDER_URL,
+                 cache_path=DEFAULT_CACHE_PATH,
+                 fast_inference=True,
+                 background=False,
+                 metrics=METRICS,
+                 embedder=None,
+                 calibration_path=DEFAULT_PATHS["calibration"]):
+        # embedder: an already-loaded encoder callable (e.g. a stand-in for benchmarks) used instead of embedder_url
+        self.embedder_url = embedder_url
+        self.fast_inference = fast_inference
+        self.metrics = metrics
+        self.preprocessor = None
+        self.numeric = None
+        self.embedder = None
+        self.model = None
+        self.calibration = None
+        self.embedding_cache = EmbeddingCache(embedder_url, path=cache_path) if cache_path else None
+
+        # Preprocessor, encoder and Keras model load concurrently; warm-up traces every stage once
+        self.loader = BackgroundLoader({
+            'preprocessor': lambda: self._load_preprocessor(num_preprocessor_path),
+            'embedder': (lambda: embedder) if embedder is not None else (lambda: _load_hub_model(embedder_url)),
+            'model': lambda: self._load_model(model_path, weights_path),
+            'calibration': lambda: _load_calibration(calibration_path, model_fingerprint(model_path, weights_path)),
+        }, warm_up=self._warm_up, background=background)
+
+    @property
+    def status(self) -> str:
+        return self.loader.status
+
+    def wait(self, timeout=None):
+        self.loader.wait(timeout)
+        return self
+
+    def _load_preprocessor(self, num_preprocessor_path):
+        preprocessor = DataPreprocessing()
+        preprocessor.num_preprocessor = joblib.load(num_preprocessor_path)
+        preprocessor.x_num_cols = NUM_COLS
+        preprocessor.x_text_cols = TEXT_COLS
+        preprocessor.y_cols = TARGETS
+        # Microsecond-scale NumPy version of num_preprocessor, verified against sklearn at load
+        return preprocessor, preprocessor.compile_numeric()
+
+    def _load_model(self, model_path, weights_path):
+        model = TriageModel()
+        model.import_model(model_path)
+        if weights_path and os.path.exists(weights_path):
+            model.load_weights(weights_path)
+        if self.fast_inference:
+            model.build_inference_fn()
+        return model
+
+    def _warm_up(self, artifacts):
+        self.preprocessor, self.numeric = artifacts['preprocessor']
+        self.embedder = artifacts['embedder']
+        self.model = artifacts['model']
+        self.calibration = artifacts['calibration']
+
+        # A synthetic patient through preprocessing, the encoder (bypassing the cache) and the model
+        sample = self.numeric.sample_frame().iloc[:1].assign(cc=self.WARM_UP_COMPLAINT)
+        self.embedder([self.WARM_UP_COMPLAINT])
+        self._predict_proba(sample, record=False)
+
+    def _stage(self, name, record=True):
+        return self.metrics.time(name) if record and self.metrics is not None else nullcontext()
+
+    def embed(self, texts, batch_size=256) -> np.ndarray:
+        self.wait()
+        return self._embed(texts, batch_size)
+
+    def _embed(self, texts, batch_size=256) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        if self.embedding_cache is not None:
+            return self.embedding_cache.embed(texts, self.embedder, batch_size=batch_size)
+        return np.concatenate([np.asarray(self.embedder(texts[i:i + batch_size]), dtype=np.float32)
+                               for i in range(0, len(texts), batch_size)])
+
+    def predict_proba(self, df: pd.DataFrame, batch_size=1024) -> np.ndarray:
+        self.wait()
+        return self._predict_proba(df, batch_size)
+
+    def _predict_proba(self, df: pd.DataFrame, batch_size=1024, record=True) -> np.ndarray:
+        if len(df) == 0:
+            return np.empty((0, len(TARGETS)), dtype=np.float32)
+        # One preprocessor call, batched embedding and chunked Keras inference for the whole frame
+        with self._stage('preprocess', record):
+            num_X = self.numeric.transform(df)
+        with self._stage('embed', record):
+            text_vec = self._embed(df['cc'].fillna('').astype(str).tolist())
+        with self._stage('predict', record):
+            if self.fast_inference:
+                probs = self.model.predict_fast(num_X, text_vec, batch_size=batch_size)
+            else:
+                preds = self.model.model.predict([num_X, text_vec], batch_size=batch_size, verbose=0)
+                flat = preds[0] if isinstance(preds, (list, tuple)) else preds
+                probs = np.asarray(flat).reshape(len(df), -1)
+            # Per-target lookup tables, one vectorized np.interp for the whole batch
+            return self.calibration(probs) if self.calibration is not None else probs
+
+    def predict_batch(self, df: pd.DataFrame, batch_size=1024) -> pd.DataFrame:
+        return pd.DataFrame(self.predict_proba(df, batch_size=batch_size), columns=TARGETS, index=df.index)
+
+    def predict_single(self, row_df: pd.DataFrame) -> dict[str, float]:
+        flat = self.predict_proba(row_df.iloc[:1]).reshape(-1)
+        return {t: float(p) for t, p in zip(TARGETS, flat)}
+
+
+class FusedTriagePipeline:
+    """Scores patients through the single SavedModel written by TriageModel.export_serving."""
+
+    def __init__(self, export_path, metrics=METRICS, calibration_path=DEFAULT_PATHS["calibration"]):
+        self.export_path = export_path
+        self.metrics = metrics
+        _lazy_import('tensorflow_text')  # the bundled encoder uses TF-Text custom ops
+        self.module = tf.saved_model.load(export_path)
+        # Exports from before the fingerprint was recorded have none, so no calibration table is accepted for them
+        fingerprint = getattr(self.module, 'model_fingerprint', None)
+        self.model_fingerprint = fingerprint.numpy().decode('utf-8') if fingerprint is not None else ''
+        self.calibration = _load_calibration(calibration_path, self.model_fingerprint)
+        self._serve = self.module.signatures['serving_default']
+        self.num_cols = [c.decode('utf-8') for c in self.module.num_cols.numpy()]
+        self.cat_cols = [c.decode('utf-8') for c in self.module.cat_cols.numpy()]
+
+    def predict_proba(self, df: pd.DataFrame, batch_size=1024) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(df), batch_size):
+            chunk = df.iloc[start:start + batch_size]
+            num = chunk[self.num_cols].apply(pd.to_numeric, errors='coerce').to_numpy(np.float32)
+            cat = chunk[self.cat_cols].fillna('').astype(str).to_numpy()
+            cc = chunk['cc'].fillna('').astype(str).to_numpy()
+            # Preprocessing, encoder and MLP run inside one graph, so they are timed as one stage
+            with self.metrics.time('fused_predict') if self.metrics is not None else nullcontext():
+                try:
+                    out = self._serve(num=tf.constant(num), cat=tf.constant(cat.reshape(len(chunk), -1)), cc=tf.constant(cc))
+                except tf.errors.InvalidArgumentError as e:
+                    # The graph's input checks (e.g. unknown categories) -> ValueError, like the sklearn path
+                    raise ValueError(e.message) from e
+            outputs.append(out['probabilities'].numpy())
+        probs = np.concatenate(outputs) if outputs else np.empty((0, len(TARGETS)), dtype=np.float32)
+        return self.calibration(probs) if self.calibration is not None else probs
+
+    def predict_batch(self, df: pd.DataFrame, batch_size=1024) -> pd.DataFrame:
+        return pd.DataFrame(self.predict_proba(df, batch_size=batch_size), columns=TARGETS, index=df.index)
+
+    def predict_single(self, row_df: pd.DataFrame) -> dict[str, float]:
+        flat = self.predict_proba(row_df.iloc[:1]).reshape(-1)
+        return {t: float(p) for t, p in zip(TARGETS, flat)}
+
+
+class MicroBatcher:
+    """Coalesce concurrent scoring requests into one embedding call and one Keras forward pass.
+
+    Requests are collected until max_batch_size rows are queued or max_wait_ms has passed since
+    the first one arrived, so batching adds at most max_wait_ms to any single request.
+    """
+
+    def __init__(self, pipeline, max_batch_size=32, max_wait_ms=5.0, metrics=METRICS):
+        assert max_batch_size > 0, "max_batch_size must be positive"
+        self.pipeline = pipeline
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="triage-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, df: pd.DataFrame) -> Future:
+        assert not self._closed, "MicroBatcher is closed"
+        future = Future()
+        self._queue.put((df, future, time.perf_counter()))
+        return future
+
+    def predict_proba(self, df: pd.DataFrame, timeout=None) -> np.ndarray:
+        return self.submit(df).result(timeout)
+
+    def predict_single(self, row_df: pd.DataFrame) -> dict[str, float]:
+        flat = self.predict_proba(row_df.iloc[:1]).reshape(-1)
+        return {t: float(p) for t, p in zip(TARGETS, flat)}
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch, rows = [item], len(item[0])
+            deadline = time.monotonic() + self.max_wait
+
+            # Keep collecting until the batch is full or the wait window closes
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self._process(batch)
+
+    def _process(self, batch):
+        # Time each request spent queued while its batch was being collected
+        started = time.perf_counter()
+        if self.metrics is not None:
+            for _, _, submitted in batch:
+                self.metrics.observe('batch_wait', started - submitted)
+        try:
+            probs = self.pipeline.predict_proba(pd.concat([df for df, _, _ in batch], ignore_index=True))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # One malformed request must not fail the others that shared its window: score each on its own
+            for df, future, _ in batch:
+                try:
+                    future.set_result(self.pipeline.predict_proba(df))
+                except Exception as request_error:
+                    future.set_exception(request_error)
+            return
+
+        self.batches += 1
+        self.rows += len(probs)
+        offset = 0
+        for df, future, _ in batch:
+            future.set_result(probs[offset:offset + len(df)])
+            offset += len(df)
@@ -0,0 +1,130 @@
+# Per-stage latency metrics
+# ---------------------------------------------------
+# Stages of a triage request (preprocess, embed, predict, triage_decision, log,
+# ...) are timed with perf_counter into a rolling window per stage for
+# p50/p95/p99, plus cumulative histogram buckets for Prometheus. METRICS is the
+# process-wide recorder shared by TriagePipeline, app2.py and src.server.
+#
+#   with METRICS.time('embed'):
+#       ...
+#   METRICS.prometheus_text()        # text exposition format for /metrics
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+# Histogram upper bounds in seconds (0.5 ms .. 10 s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Stage:
+    def __init__(self, window, n_buckets):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * (n_buckets + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+
+class LatencyRecorder:
+    def __init__(self, window=1024, buckets=DEFAULT_BUCKETS):
+        self.window = window
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = _Stage(self.window, len(self.buckets))
+            s.recent.append(seconds)
+            s.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+            s.count += 1
+            s.sum += seconds
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def stages(self) -> list[str]:
+        with self._lock:
+            return list(self._stages)
+
+    def percentiles(self, stage: str) -> dict:
+        """Rolling-window p50/p95/p99 and mean in milliseconds, plus the lifetime count."""
+        with self._lock:
+            s = self._stages.get(stage)
+            recent = np.array(s.recent) if s is not None else np.empty(0)
+            count = s.count if s is not None else 0
+        if recent.size == 0:
+            return {'count': count, 'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+        p50, p95, p99 = np.percentile(recent, [q * 100 for q in QUANTILES]) * 1000
+        return {'count': count, 'mean_ms': float(recent.mean() * 1000),
+                'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+    def summary(self) -> dict:
+        return {stage: self.percentiles(stage) for stage in self.stages()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self, prefix='triage') -> str:
+        """Prometheus text format: a cumulative histogram and rolling-window quantiles per stage."""
+        name = f"{prefix}_stage_latency_seconds"
+        lines = [f"# HELP {name} Latency of each triage request stage.", f"# TYPE {name} histogram"]
+        quantile_lines = [f"# HELP {name}_window Rolling-window latency quantiles of each stage.",
+                          f"# TYPE {name}_window summary"]
+        with self._lock:
+            snapshot = {stage: (list(s.buckets), s.count, s.sum, np.array(s.recent)) for stage, s in self._stages.items()}
+        for stage, (buckets, count, total, recent) in sorted(snapshot.items()):
+            cumulative = np.cumsum(buckets)
+            for bound, n in zip(self.buckets + (float('inf'),), cumulative):
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {int(n)}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+            if recent.size:
+                for q, v in zip(QUANTILES, np.percentile(recent, [q * 100 for q in QUANTILES])):
+                    quantile_lines.append(f'{name}_window{{stage="{stage}",quantile="{q}"}} {float(v)!r}')
+            quantile_lines.append(f'{name}_window_sum{{stage="{stage}"}} {float(recent.sum())!r}')
+            quantile_lines.append(f'{name}_window_count{{stage="{stage}"}} {int(recent.size)}')
+        return "\n".join(lines + quantile_lines) + "\n"
+
+
+METRICS = LatencyRecorder()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def start_metrics_server(recorder: LatencyRecorder = METRICS, host='0.0.0.0', port=9100) -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread (for processes without their own HTTP server, e.g. Streamlit)."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            data = recorder.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,135 @@
+# Pure-NumPy numeric preprocessor
+# ---------------------------------------------------
+# "Compiles" the fitted sklearn ColumnTransformer (median imputer -> Yeo-Johnson
+# -> StandardScaler for vitals, mode imputer -> one-hot for categories) into a
+# few vectorized NumPy operations, skipping sklearn's per-call validation.
+# Outputs are identical to num_preprocessor.transform and checked against it.
+
+import numpy as np
+import pandas as pd
+
+
+def extract_numeric_params(column_transformer) -> dict:
+    """Fitted imputer / Yeo-Johnson / scaler / one-hot parameters of num_preprocessor as plain arrays."""
+    params = {'num_cols': [], 'cat_cols': [], 'categories': [], 'modes': []}
+    for name, pipeline, cols in column_transformer.transformers_:
+        if name == 'num':
+            imputer, power, scaler = (pipeline.named_steps[k] for k in ('imputer', 'power', 'scaler'))
+            params['num_cols'] = list(cols)
+            params['median'] = np.asarray(imputer.statistics_, dtype=np.float64)
+            params['lambdas'] = np.asarray(power.lambdas_, dtype=np.float64)
+            # PowerTransformer(standardize=True) keeps its own StandardScaler
+            params['power_mean'] = power._scaler.mean_ if power.standardize else np.zeros(len(cols))
+            params['power_scale'] = power._scaler.scale_ if power.standardize else np.ones(len(cols))
+            params['scaler_mean'] = scaler.mean_
+            params['scaler_scale'] = scaler.scale_
+        elif name == 'cat':
+            imputer, encoder = pipeline.named_steps['imputer'], pipeline.named_steps['encoder']
+            params['cat_cols'] = list(cols)
+            params['modes'] = [str(m) for m in imputer.statistics_]
+            params['categories'] = [[str(c) for c in cats] for cats in encoder.categories_]
+            params['handle_unknown'] = encoder.handle_unknown
+    return params
+
+
+class CompiledNumericPreprocessor:
+    def __init__(self, params: dict):
+        self.params = params
+        self.num_cols = list(params['num_cols'])
+        self.cat_cols = list(params['cat_cols'])
+
+        n = len(self.num_cols)
+        self._median = np.asarray(params.get('median', np.zeros(n)), dtype=np.float64)
+        self._lambdas = np.asarray(params.get('lambdas', np.ones(n)), dtype=np.float64)
+        # PowerTransformer's internal standardization, then the pipeline's StandardScaler
+        self._shift = np.asarray(params.get('power_mean', np.zeros(n)), dtype=np.float64)
+        self._scale1 = np.asarray(params.get('power_scale', np.ones(n)), dtype=np.float64)
+        self._shift2 = np.asarray(params.get('scaler_mean', np.zeros(n)), dtype=np.float64)
+        self._scale2 = np.asarray(params.get('scaler_scale', np.ones(n)), dtype=np.float64)
+
+        eps = np.spacing(1.0)
+        self._lam_zero = np.abs(self._lambdas) < eps
+        self._lam_two = np.abs(self._lambdas - 2.0) < eps
+        self._safe_lam = np.where(self._lam_zero, 1.0, self._lambdas)
+        self._safe_2_lam = np.where(self._lam_two, 1.0, 2.0 - self._lambdas)
+
+        self._modes = list(params['modes'])
+        # OneHotEncoder(handle_unknown='ignore') encodes unseen categories as all zeros
+        self._ignore_unknown = params.get('handle_unknown', 'error') == 'ignore'
+        self._lookups = [{c: i for i, c in enumerate(cats)} for cats in params['categories']]
+        self._offsets = n + np.concatenate([[0], np.cumsum([len(c) for c in params['categories']])[:-1]]).astype(int) \
+            if params['categories'] else np.empty(0, dtype=int)
+        self.n_features_out = n + sum(len(c) for c in params['categories'])
+
+    @classmethod
+    def from_column_transformer(cls, column_transformer):
+        return cls(extract_numeric_params(column_transformer))
+
+    def _yeo_johnson(self, x):
+        # Same branches as sklearn's PowerTransformer._yeo_johnson_transform
+        pos = np.maximum(x, 0.0)
+        neg = np.maximum(-x, 0.0)
+        with np.errstate(over='ignore', invalid='ignore'):
+            out_pos = np.where(self._lam_zero, np.log1p(pos), (np.power(pos + 1.0, self._lambdas) - 1.0) / self._safe_lam)
+            out_neg = np.where(self._lam_two, -np.log1p(neg), -(np.power(neg + 1.0, 2.0 - self._lambdas) - 1.0) / self._safe_2_lam)
+        return np.where(x >= 0, out_pos, out_neg)
+
+    def transform_arrays(self, num, cat=None) -> np.ndarray:
+        """num: float [n, len(num_cols)] with NaN for missing; cat: object [n, len(cat_cols)] with NaN for missing."""
+        num = np.asarray(num, dtype=np.float64).reshape(-1, len(self.num_cols))
+        out = np.zeros((num.shape[0], self.n_features_out), dtype=np.float64)
+
+        x = np.where(np.isnan(num), self._median, num)
+        y = self._yeo_johnson(x)
+        out[:, :len(self.num_cols)] = ((y - self._shift) / self._scale1 - self._shift2) / self._scale2
+
+        if self.cat_cols:
+            cat = np.asarray(cat, dtype=object).reshape(num.shape[0], len(self.cat_cols))
+            for j, (lookup, mode, offset) in enumerate(zip(self._lookups, self._modes, self._offsets)):
+                for i, value in enumerate(cat[:, j]):
+                    # Like SimpleImputer on object columns, only float NaN counts as missing
+                    if isinstance(value, float) and np.isnan(value):
+                        value = mode
+                    idx = lookup.get(str(value))
+                    if idx is None:
+                        if self._ignore_unknown:
+                            continue
+                        raise ValueError(f"Found unknown category {value!r} in column '{self.cat_cols[j]}' during transform")
+                    out[i, offset + idx] = 1.0
+        return out
+
+    def transform(self, X) -> np.ndarray:
+        """X: a patient dict, a list of dicts or a DataFrame with num_cols + cat_cols."""
+        if isinstance(X, dict):
+            X = [X]
+        if isinstance(X, pd.DataFrame):
+            num = X[self.num_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            cat = X[self.cat_cols].to_numpy(dtype=object)
+        else:
+            num = np.array([[row.get(c, np.nan) for c in self.num_cols] for row in X], dtype=np.float64)
+            cat = np.array([[row.get(c, np.nan) for c in self.cat_cols] for row in X], dtype=object)
+        return self.transform_arrays(num, cat)
+
+    def sample_frame(self) -> pd.DataFrame:
+        """Synthetic rows covering medians, both Yeo-Johnson branches, missing values and every category."""
+        rows = []
+        n_rows = max([4] + [len(c) + 1 for c in self.params['categories']])
+        factors = [1.0, 0.5, 1.5, -0.25]
+        for i in range(n_rows):
+            row = {c: m * factors[i % len(factors)] for c, m in zip(self.num_cols, self._median)}
+            if i == n_rows - 1 and self.num_cols:
+                row[self.num_cols[0]] = np.nan
+            for c, cats in zip(self.cat_cols, self.params['categories']):
+                row[c] = cats[i] if i < len(cats) else np.nan
+            rows.append(row)
+        return pd.DataFrame(rows, columns=self.num_cols + self.cat_cols)
+
+    def verify(self, column_transformer, X=None, rtol=1e-7, atol=1e-9) -> float:
+        """Check outputs against the sklearn transformer; returns the max abs difference or raises AssertionError."""
+        X = self.sample_frame() if X is None else X
+        expected = np.asarray(column_transformer.transform(X[self.num_cols + self.cat_cols]), dtype=np.float64)
+        actual = self.transform(X)
+        assert expected.shape == actual.shape, f"shape mismatch: sklearn {expected.shape} vs compiled {actual.shape}"
+        assert np.allclose(actual, expected, rtol=rtol, atol=atol), \
+            f"compiled preprocessor differs from sklearn (max abs diff {np.abs(actual - expected).max():.3g})"
+        return float(np.abs(actual - expected).max()) if actual.size else 0.0
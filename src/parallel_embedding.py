@@ -0,0 +1,131 @@
+# Multi-process chief-complaint embedding
+# ---------------------------------------------------
+# Shards the text column across spawned worker processes, each holding its own
+# USE encoder with a fixed number of intra-op threads, and writes the vectors in
+# order into one preallocated shared-memory float32 array. ParallelEmbedder has
+# the same transform() as TextEmbedder, so it can be set as
+# DataPreprocessing.text_embedder (see DataPreprocessing.parallel_embedding).
+
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+_ENCODER = None
+_BATCH_SIZE = 256
+
+
+def _attach(name):
+    # Workers only borrow the block; the parent owns (and unlinks) it
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(embedder_url, intra_op_threads, batch_size):
+    global _ENCODER, _BATCH_SIZE
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from src.source import _load_hub_model
+    _ENCODER = _load_hub_model(embedder_url)
+    _BATCH_SIZE = batch_size
+
+
+def _embedding_dim():
+    return int(np.asarray(_ENCODER([" "])).shape[-1])
+
+
+def _embed_shard(shm_name, shape, start, texts):
+    shm = _attach(shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        for i in range(0, len(texts), _BATCH_SIZE):
+            chunk = texts[i:i + _BATCH_SIZE]
+            out[start + i:start + i + len(chunk)] = np.asarray(_ENCODER(chunk), dtype=np.float32)
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class ParallelEmbedder:
+    """Embed texts with n_workers encoder processes of intra_op_threads threads each."""
+
+    def __init__(self, embedder_url, n_workers=None, intra_op_threads=None, batch_size=256, shard_size=4096,
+                 verbose=True, cache=None):
+        assert embedder_url is not None, "embedder_url must be set"
+        assert batch_size > 0 and shard_size > 0, "batch_size and shard_size must be positive"
+        cores = os.cpu_count() or 1
+        self.embedder_url = embedder_url
+        # Default: one worker per 4 cores, and the cores split evenly between workers
+        self.n_workers = n_workers or max(1, cores // 4)
+        self.intra_op_threads = intra_op_threads or max(1, cores // self.n_workers)
+        self.batch_size = batch_size
+        self.shard_size = shard_size
+        self.verbose = verbose
+        self.cache = cache
+        self.dim = None
+        self._pool = None
+
+    def start(self):
+        """Spawn the workers and load one encoder in each (done lazily by the first transform)."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=mp.get_context('spawn'),  # fork is unsafe once TensorFlow has started threads
+                initializer=_init_worker,
+                initargs=(self.embedder_url, self.intra_op_threads, self.batch_size))
+            self.dim = self._pool.submit(_embedding_dim).result()
+        return self
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        texts = [str(text) for text in np.asarray(X, dtype=object).reshape(-1)]
+        if self.cache is not None:
+            return self.cache.embed(texts, self.embed)
+        return self.embed(texts)
+
+    def embed(self, texts) -> np.ndarray:
+        self.start()
+        n = len(texts)
+        if n == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        shape = (n, self.dim)
+        shm = shared_memory.SharedMemory(create=True, size=n * self.dim * np.dtype(np.float32).itemsize)
+        try:
+            start_time = time.perf_counter()
+            futures = [self._pool.submit(_embed_shard, shm.name, shape, start, texts[start:start + self.shard_size])
+                       for start in range(0, n, self.shard_size)]
+            done = 0
+            for future in as_completed(futures):
+                done += future.result()
+                if self.verbose:
+                    elapsed = time.perf_counter() - start_time
+                    print(f"\rEmbedded {done}/{n} texts ({done / max(elapsed, 1e-9):.0f} texts/s, {self.n_workers} workers)",
+                          end='' if done < n else '\n')
+            # Shards land at their own offsets, so the copy is already in input order
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,200 @@
+# Background prediction log writer
+# ---------------------------------------------------
+# The apps hand each logged prediction to an in-memory queue and return; one
+# daemon thread per process batches rows into Parquet row groups of one open
+# file. Files rotate by row count and age (max_file_seconds bounds how long
+# flushed rows stay unreadable) and are named per process, so concurrent
+# Streamlit workers never share a file. A file is written as
+# "<name>.parquet.part" and renamed once closed, so only complete files match
+# *.parquet.
+#
+# Columns have declared Arrow types (float64 for vitals and probabilities) and
+# values are only ever cast losslessly: a batch that does not fit the open
+# file's schema starts a new file with its own schema, and a value that does
+# not fit its declared type keeps its own type with a printed warning.
+
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.triage import NUM_COLS
+
+
+DEFAULT_LOG_DIR = "logs"
+
+CATEGORICAL_FIELDS = ['sex', 'how_come_er', 't_n']
+LOG_FIELD_TYPES = {
+    'timestamp': pa.string(),
+    'session': pa.string(),
+    **{c: pa.float64() for c in NUM_COLS if c not in CATEGORICAL_FIELDS},
+    **{c: pa.string() for c in CATEGORICAL_FIELDS},
+    'cc': pa.string(),
+    'triage_level': pa.int64(),
+    'zone': pa.string(),
+    **{c: pa.float64() for c in ['lvl1', 'lvl2', 'lvl3', 'lvl4']},
+}
+
+
+def field_type(name: str):
+    """Declared Arrow type of a log column (pred_* probabilities are float64), or None to infer it."""
+    if name.startswith('pred_'):
+        return pa.float64()
+    return LOG_FIELD_TYPES.get(name)
+
+
+def _plain(value):
+    # NumPy scalars (from DataFrame rows / model outputs) -> Python values for Arrow
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def rows_to_table(rows: list[dict]) -> pa.Table:
+    """Arrow table with declared column types; casts are safe, so nothing is truncated or downcast."""
+    names = list(dict.fromkeys(k for row in rows for k in row))
+    columns = []
+    for name in names:
+        column = pa.array([row.get(name) for row in rows], from_pandas=True)
+        target = field_type(name)
+        if target is not None and column.type != target:
+            try:
+                column = column.cast(target, safe=True)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                print(f"prediction log: column {name!r} kept as {column.type}, not {target}: {e}")
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=names)
+
+
+class PredictionLogWriter:
+    def __init__(self, directory=DEFAULT_LOG_DIR, prefix="predictions", flush_rows=256, flush_seconds=5.0,
+                 max_file_rows=100_000, max_file_seconds=300.0, max_queue=10_000):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_file_rows = max_file_rows
+        self.max_file_seconds = max_file_seconds
+
+        self.written = 0
+        self.dropped = 0
+        self.files = []
+        self.sinks = []  # callables receiving every flushed batch as a list of dicts (e.g. AuditStore.insert_many)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = None
+        self._path = None
+        self._schema = None
+        self._file_rows = 0
+        self._file_opened = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, row: dict):
+        """Enqueue one row; never blocks. Rows are dropped (and counted) if the queue is full."""
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait({k: _plain(v) for k, v in row.items()})
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.flush_rows:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                self._flush(batch)
+            if self._writer is not None and (stop or time.monotonic() - self._file_opened >= self.max_file_seconds):
+                self._rotate()
+
+    def _flush(self, rows):
+        try:
+            self._write_table(self._conform(rows_to_table(rows)))
+            self.written += len(rows)
+        except Exception as e:
+            self.dropped += len(rows)
+            print(f"prediction log: failed to write {len(rows)} rows: {e}")
+        for sink in self.sinks:
+            try:
+                sink(rows)
+            except Exception as e:
+                print(f"prediction log: sink {sink!r} failed: {e}")
+
+    def _conform(self, table):
+        # The batch in the open file's schema (absent columns as nulls), or a new file when that needs a lossy cast
+        if self._schema is None or table.schema == self._schema:
+            return table
+        if set(table.column_names) <= set(self._schema.names):
+            columns = [table[f.name] if f.name in table.column_names else pa.nulls(table.num_rows, f.type)
+                       for f in self._schema]
+            try:
+                return pa.Table.from_arrays(columns, names=self._schema.names).cast(self._schema, safe=True)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+        self._rotate()
+        return table
+
+    def _write_table(self, table):
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self._path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{os.getpid()}-{len(self.files)}.parquet")
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self._path + ".part", self._schema, compression="zstd")
+            self._file_rows = 0
+            self._file_opened = time.monotonic()
+        self._writer.write_table(table)
+        self._file_rows += table.num_rows
+        if self._file_rows >= self.max_file_rows:
+            self._rotate()
+
+    def _rotate(self):
+        if self._writer is None:
+            self._schema = None
+            return
+        self._writer.close()
+        os.replace(self._path + ".part", self._path)
+        self.files.append(self._path)
+        self._writer = None
+        self._schema = None
+
+
+def log_signature(directory=DEFAULT_LOG_DIR, prefix="predictions") -> tuple:
+    """(path, mtime_ns, size) of every completed log file; changes whenever a file rotates in (a cheap cache key)."""
+    paths = sorted(glob.glob(os.path.join(directory, f"{prefix}-*.parquet")))
+    stats = [(p, os.stat(p)) for p in paths if os.path.exists(p)]
+    return tuple((p, st.st_mtime_ns, st.st_size) for p, st in stats)
+
+
+def read_prediction_logs(directory=DEFAULT_LOG_DIR, prefix="predictions") -> pd.DataFrame:
+    """All completed log files in directory as one DataFrame (open .part files are skipped)."""
+    paths = sorted(glob.glob(os.path.join(directory, f"{prefix}-*.parquet")))
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
@@ -0,0 +1,164 @@
+# Headless HTTP/JSON triage service
+# ---------------------------------------------------
+# Serves the same TriagePipeline and triage rules as app2.py from one warm
+# process, for EMS tablets and the registration system.
+#
+#   python -m src.server --port 8000
+#
+#   GET  /health
+#   GET  /metrics  per-stage latency histograms (Prometheus text format)
+#   POST /predict  {"patient": {...}}  or  {"patients": [{...}, ...]}
+#                  optional: "cutoffs", "red_flags", "apply_redflags"
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from src.inference import TriagePipeline, FusedTriagePipeline, MicroBatcher, DEFAULT_PATHS, DEFAULT_EMBEDDER_URL
+from src.triage import TARGETS, NUM_COLS, TEXT_COLS, VITAL_COLS, DEFAULT_CUTOFFS, DEFAULT_RED_FLAGS, triage_level
+from src.metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _patients_frame(patients: list) -> pd.DataFrame:
+    if not patients or not all(isinstance(p, dict) for p in patients):
+        raise BadRequest("expected 'patient' object or non-empty 'patients' list")
+    missing = sorted({c for p in patients for c in NUM_COLS + TEXT_COLS if c not in p})
+    if missing:
+        raise BadRequest(f"missing fields: {', '.join(missing)}")
+    df = pd.DataFrame(patients, columns=NUM_COLS + TEXT_COLS)
+    for col in VITAL_COLS + ['age', 'dbp', 'pr']:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (TypeError, ValueError):
+            raise BadRequest(f"field '{col}' must be numeric")
+    return df
+
+
+def _thresholds(payload: dict, name: str, defaults: dict) -> dict:
+    """defaults overridden by payload[name], which must map known keys to numbers."""
+    overrides = payload.get(name) or {}
+    if not isinstance(overrides, dict):
+        raise BadRequest(f"'{name}' must be an object")
+    unknown = sorted(set(overrides) - set(defaults))
+    if unknown:
+        raise BadRequest(f"unknown '{name}' keys: {', '.join(unknown)} (expected {', '.join(defaults)})")
+    for key, value in overrides.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise BadRequest(f"'{name}.{key}' must be a number")
+    return {**defaults, **overrides}
+
+
+def score_patients(pipeline, payload: dict) -> dict:
+    # pipeline is a TriagePipeline / FusedTriagePipeline or a MicroBatcher wrapping one
+    single = 'patient' in payload
+    df = _patients_frame([payload['patient']] if single else payload.get('patients'))
+    cutoffs = _thresholds(payload, 'cutoffs', DEFAULT_CUTOFFS)
+    red_flags = _thresholds(payload, 'red_flags', DEFAULT_RED_FLAGS)
+    apply_redflags = bool(payload.get('apply_redflags', True))
+
+    try:
+        probs = pipeline.predict_proba(df)
+    except ValueError as e:
+        # Input the fitted preprocessing rejects, e.g. an unknown category
+        raise BadRequest(str(e))
+    results = []
+    with METRICS.time('triage_decision'):
+        for row, vitals in zip(probs, df.to_dict('records')):
+            preds = {t: float(p) for t, p in zip(TARGETS, row)}
+            level, reason, score, flags = triage_level(preds, vitals, cutoffs, red_flags, apply_redflags)
+            results.append({
+                "probabilities": preds,
+                "triage_level": level,
+                "reason": reason,
+                "score": float(score),
+                "red_flags": flags,
+            })
+    return results[0] if single else {"results": results}
+
+
+class TriageRequestHandler(BaseHTTPRequestHandler):
+    pipeline = None
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {"status": "ok", "targets": TARGETS})
+        elif self.path == '/metrics':
+            data = METRICS.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise BadRequest("expected a JSON object")
+            with METRICS.time('request'):
+                result = score_patients(self.pipeline, payload)
+            self._send_json(200, result)
+        except (BadRequest, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+
+def make_server(pipeline, host='127.0.0.1', port=8000) -> ThreadingHTTPServer:
+    handler = type('BoundTriageRequestHandler', (TriageRequestHandler,), {'pipeline': pipeline})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless ED triage inference service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--num-preprocessor', default=DEFAULT_PATHS["num_preprocessor"])
+    parser.add_argument('--model', default=DEFAULT_PATHS["keras_model"])
+    parser.add_argument('--weights', default=DEFAULT_PATHS["keras_weights"])
+    parser.add_argument('--embedder-url', default=DEFAULT_EMBEDDER_URL)
+    parser.add_argument('--calibration', default=DEFAULT_PATHS["calibration"], help="per-target calibration tables (used when the file exists)")
+    parser.add_argument('--saved-model', default=None, help="fused SavedModel from src.export; replaces the three artifacts above")
+    parser.add_argument('--max-batch-size', type=int, default=32, help="rows coalesced into one forward pass")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="longest a request waits for others to join its batch")
+    args = parser.parse_args()
+
+    if args.saved_model:
+        pipeline = FusedTriagePipeline(args.saved_model, calibration_path=args.calibration)
+    else:
+        pipeline = TriagePipeline(args.num_preprocessor, args.model, args.weights, args.embedder_url,
+                                  calibration_path=args.calibration)
+    batcher = MicroBatcher(pipeline, args.max_batch_size, args.max_wait_ms)
+    server = make_server(batcher, args.host, args.port)
+    print(f"Serving triage predictions on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
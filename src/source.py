@@ -1,9 +1,14 @@
-
 # Importing libraries
+import datetime
+import glob
+import importlib
+import os
+import re
+import sys
+import time
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import re
 
 # Pipeline
 from sklearn.pipeline import Pipeline, make_pipeline
@@ -13,28 +18,43 @@ from sklearn.preprocessing import LabelEncoder, OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, RobustScaler, FunctionTransformer, PowerTransformer
-from sklearn.metrics.pairwise import rbf_kernel
 from sklearn.base import BaseEstimator, TransformerMixin
 
 # Compose
 from sklearn.compose import make_column_selector, make_column_transformer
 
-# Training
+# Training / inference
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
+from tensorflow import keras
 
-# Embedding
-import tensorflow_hub as hub
-import tensorflow_text
+from src.numeric_preprocessor import CompiledNumericPreprocessor, extract_numeric_params
+from src.encoder_store import resolve as resolve_encoder
+from src.feature_store import fingerprint
+from src.calibration import CalibrationTable, brier_scores, model_fingerprint
+from src.triage import TARGETS
 
-# Class weights calculation for imbalanced data
-import tensorflow.keras.backend as K
-from sklearn.utils.class_weight import compute_class_weight
+# Training-only, plotting and embedding dependencies (matplotlib, keras_tuner,
+# tensorflow_hub/tensorflow_text, sklearn.model_selection/metrics) are imported
+# on first use so serving processes start without them.
+# See `python -m src.import_report` for where startup time goes.
+IMPORT_TIMES = {}
+
+
+def _lazy_import(name):
+    """Import a heavy module on first use and record how long that first import took."""
+    if name not in IMPORT_TIMES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        IMPORT_TIMES[name] = time.perf_counter() - start
+    return sys.modules[name]
+
+
+def _load_hub_model(url):
+    # tensorflow_text registers custom ops (e.g., SentencepieceOp) used by the multilingual USE
+    _lazy_import('tensorflow_text')
+    # Prefetched encoders load straight from the extracted directory in the local store
+    return _lazy_import('tensorflow_hub').load(resolve_encoder(url))
 
-# keras tuner
-import keras_tuner as kt
-from tensorflow import keras
 
 class TriageModel:
     def __init__(self):
@@ -64,6 +84,11 @@ class TriageModel:
         }
 
         self.class_weights = None
+        self._inference_fn = None
+        self.tuning_results = None
+        self.pareto_set = None
+        self.throughput = None
+        self.calibration = None
 
 
     def set_parameters(self, parameters):
@@ -71,6 +96,7 @@ class TriageModel:
 
     def import_model(self, model_path):
         self.model = tf.keras.models.load_model(model_path)
+        self._inference_fn = None
         self.model.summary()
 
     def create_model(self):
@@ -111,6 +137,7 @@ class TriageModel:
                     metrics=self.metrics)
 
         self.model = model
+        self._inference_fn = None
         self.model.summary()
 
     def load_weights(self, weights_path):
@@ -124,12 +151,20 @@ class TriageModel:
         self.test_dataset = test_dataset
         self.class_weights = classweights
 
-    def train(self, epochs = 200, batch_size = 32):
+    def train(self, epochs = 200, batch_size = None, jit_compile = False, cache = None, shuffle_buffer = None,
+              prefetch = tf.data.AUTOTUNE, report_throughput = True):
+        """Fit on train_dataset; batch_size re-batches the (already batched) datasets, cache is True (memory) or a file path."""
         assert self.model is not None, "need to call method 'import_model()' first"
         assert self.train_dataset is not None, "need to call method 'import_data()' first"
         assert self.val_dataset is not None, "need to call method 'import_data()' first"
         assert self.test_dataset is not None, "need to call method 'import_data()' first"
 
+        if jit_compile:
+            # Recompile with XLA-fused train/eval steps; weights and optimizer state are kept
+            self.model.compile(optimizer=self.model.optimizer, loss=self.model.loss, metrics=self.metrics, jit_compile=True)
+
+        train_dataset = self._prepare_dataset(self.train_dataset, batch_size, cache, shuffle_buffer, prefetch)
+        val_dataset = self._prepare_dataset(self.val_dataset, batch_size, cache, None, prefetch)
 
         log_dir = "logs/fit/" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
         tensorboard_callback = tf.keras.callbacks.TensorBoard(log_dir=log_dir, histogram_freq=0)
@@ -143,8 +178,25 @@ class TriageModel:
             restore_best_weights=True,
             )
 
-        self.history = self.model.fit(self.train_dataset, validation_data=self.val_dataset, epochs = epochs, batch_size = batch_size,
-                                callbacks = [early_stopping, tensorboard_callback])
+        callbacks = [early_stopping, tensorboard_callback]
+        if report_throughput:
+            self.throughput = ThroughputCallback()
+            callbacks.append(self.throughput)
+
+        self.history = self.model.fit(train_dataset, validation_data=val_dataset, epochs = epochs, callbacks = callbacks)
+
+    def _prepare_dataset(self, dataset, batch_size, cache, shuffle_buffer, prefetch):
+        if batch_size is not None:
+            # The datasets arrive batched from convert_to_dataset; fit(batch_size=...) would be ignored
+            dataset = dataset.unbatch()
+        if cache:
+            dataset = dataset.cache() if cache is True else dataset.cache(cache)
+        if shuffle_buffer:
+            # Shuffles rows when re-batching, otherwise whole batches
+            dataset = dataset.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+        if batch_size is not None:
+            dataset = dataset.batch(batch_size)
+        return dataset.prefetch(prefetch) if prefetch else dataset
 
     def evaluate(self):
         assert self.model is not None, "need to call method 'import_model()' first"
@@ -165,6 +217,10 @@ class TriageModel:
         with open('./history.txt', 'w') as f:
             f.write(str(self.history.history))
         self.model.save('./model.keras')
+        if self.calibration is not None:
+            # Tie the table to exactly these files; TriagePipeline refuses it for any other model
+            self.calibration.save('./calibration.joblib',
+                                  fingerprint=model_fingerprint('./model.keras', './weights.weights.h5'))
 
 
     def predict(self):
@@ -172,37 +228,273 @@ class TriageModel:
         assert self.test_dataset is not None, "need to call method 'import_data()' first"
         self.predictions = self.model.predict(self.test_dataset)
 
-    def hyperparameter_tuning(self):
-        pass
+    def _labels_and_predictions(self, dataset):
+        # One pass, so labels and predictions stay aligned for generator-backed datasets too
+        labels, predictions = [], []
+        for x, y in dataset:
+            labels.append(np.asarray(y, dtype=np.float64))
+            predictions.append(self.predict_fast(x['num'], x['text']))
+        return np.concatenate(labels), np.concatenate(predictions)
+
+    def calibrate(self, method='isotonic', targets=TARGETS):
+        """Fit per-target isotonic / Platt maps on the validation set and compile them into lookup tables.
+
+        The table is stored in self.calibration, written by save_model() as calibration.joblib together
+        with a fingerprint of model.keras / weights.weights.h5, and applied by TriagePipeline only to
+        those same files.
+        """
+        assert self.model is not None, "need to call method 'import_model() / create_model()' first"
+        assert self.val_dataset is not None, "need to call method 'import_data()' first"
+
+        y_val, p_val = self._labels_and_predictions(self.val_dataset)
+        self.calibration = CalibrationTable.fit(y_val, p_val, targets, method=method)
+
+        report = pd.DataFrame({'brier_val': brier_scores(y_val, p_val),
+                               'brier_val_calibrated': brier_scores(y_val, self.calibration(p_val))}, index=targets)
+        if self.test_dataset is not None:
+            y_test, p_test = self._labels_and_predictions(self.test_dataset)
+            report['brier_test'] = brier_scores(y_test, p_test)
+            report['brier_test_calibrated'] = brier_scores(y_test, self.calibration(p_test))
+        print(report.round(5).to_string())
+        return self.calibration
+
+    def load_calibration(self, calibration_path):
+        self.calibration = CalibrationTable.load(calibration_path)
+
+    def build_inference_fn(self):
+        assert self.model is not None, "need to call method 'import_model() / create_model()' first"
+        # Traced once for any batch size; skips the data adapter and step machinery of model.predict
+        model = self.model
+        num_dim, text_dim = model.inputs[0].shape[-1], model.inputs[1].shape[-1]
+
+        @tf.function(input_signature=[tf.TensorSpec([None, num_dim], tf.float32),
+                                      tf.TensorSpec([None, text_dim], tf.float32)])
+        def infer(num, text):
+            return model([num, text], training=False)
+
+        self._inference_fn = infer
+        return infer
+
+    def predict_fast(self, num_X, text_X, batch_size=1024):
+        if self._inference_fn is None:
+            self.build_inference_fn()
+        num_X = np.asarray(num_X, dtype=np.float32)
+        text_X = np.asarray(text_X, dtype=np.float32)
+        outputs = [self._inference_fn(num_X[i:i + batch_size], text_X[i:i + batch_size]).numpy()
+                   for i in range(0, len(num_X), batch_size)]
+        return np.concatenate(outputs) if outputs else np.empty((0, self.model.outputs[0].shape[-1]), dtype=np.float32)
+
+    def benchmark_inference(self, num_X, text_X, repeats=100):
+        # Per-request latency of model.predict vs. the traced path, on the first row only
+        num_row, text_row = np.asarray(num_X[:1], dtype=np.float32), np.asarray(text_X[:1], dtype=np.float32)
+        runners = {
+            'predict': lambda: self.model.predict([num_row, text_row], verbose=0),
+            'predict_fast': lambda: self.predict_fast(num_row, text_row),
+        }
+        results = {}
+        for name, run in runners.items():
+            run()  # warm-up (tracing, first-call allocation)
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {'mean_ms': float(np.mean(timings)), 'p50_ms': float(np.percentile(timings, 50)),
+                             'p95_ms': float(np.percentile(timings, 95))}
+            print(name, {k: round(v, 3) for k, v in results[name].items()})
+        return results
+
+    def export_serving(self, export_path, preprocessor, embedder_url, model_files=('./model.keras', './weights.weights.h5')):
+        """Save one SavedModel running numeric preprocessing, the text encoder and the MLP in a single graph.
+
+        model_files are the saved Keras files this model was loaded from (save_model() output by default);
+        their model_fingerprint() is stored in the export so FusedTriagePipeline accepts only their calibration.
+        """
+        assert self.model is not None, "need to call method 'import_model() / create_model()' first"
+        fingerprint = model_fingerprint(*model_files) if any(f and os.path.exists(f) for f in model_files) else ''
+        module = TriageServingModule(self.model, preprocessor.numeric_params(), embedder_url, fingerprint)
+        tf.saved_model.save(module, export_path, signatures={'serving_default': module.serve})
+        print(f"Exported serving model to {export_path}")
+        return module
+
+    def hyperparameter_tuning(self, search_space=None, n_trials=20, n_workers=None, epochs=30, batch_size=32,
+                              patience=5, latency_repeats=50, cache_dir=None, seed=0):
+        """Random search over self.parameters in parallel processes; returns all trials with a 'pareto' column.
+
+        Trials are scored on validation PRC/AUC, single-row predict_fast latency and model size.
+        Pick a row from self.pareto_set and pass it to set_parameters() before create_model().
+        """
+        assert self.train_dataset is not None, "need to call method 'import_data()' first"
+        assert self.val_dataset is not None, "need to call method 'import_data()' first"
+        from src.tuning import tune, DEFAULT_CACHE_DIR
+
+        self.tuning_results = tune(self.train_dataset, self.val_dataset, self.parameters, search_space=search_space,
+                                   n_trials=n_trials, n_workers=n_workers, epochs=epochs, batch_size=batch_size,
+                                   patience=patience, latency_repeats=latency_repeats,
+                                   cache_dir=cache_dir or DEFAULT_CACHE_DIR, seed=seed)
+        self.pareto_set = self.tuning_results[self.tuning_results['pareto']].sort_values('val_prc', ascending=False)
+        print(self.pareto_set[['trial', 'val_prc', 'val_auc', 'latency_p50_ms', 'params'] + list(self.parameters)].to_string(index=False))
+        return self.tuning_results
 
     def download(self):
+        files = _lazy_import('google.colab.files')  # Colab-only
         files.download('./weights.weights.h5')
         files.download('./evaluation_results.txt')
         files.download('./history.txt')
         files.download('./model.keras')
+        if os.path.exists('./calibration.joblib'):
+            files.download('./calibration.joblib')
         files.download ('/predictions.csv')
 
 
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Print and record training steps/sec for every epoch."""
+
+    def __init__(self):
+        super().__init__()
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._steps = 0
+        self._start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        # Includes the validation pass, which runs inside the epoch
+        seconds = time.perf_counter() - self._start
+        self.epochs.append({'epoch': epoch + 1, 'steps': self._steps, 'seconds': seconds,
+                            'steps_per_sec': self._steps / max(seconds, 1e-9)})
+        print(f"Epoch {epoch + 1}: {self._steps} steps in {seconds:.1f}s ({self.epochs[-1]['steps_per_sec']:.1f} steps/s)")
+
+
+class TriageServingModule(tf.Module):
+    """Raw vitals + category tokens + chief complaint -> TARGETS probabilities, as TF ops only.
+
+    Signature inputs: num (float32 [n, len(num_cols)], NaN = missing),
+    cat (string [n, len(cat_cols)], '' = missing) and cc (string [n]).
+    Unknown categories follow the fitted OneHotEncoder: all zeros with handle_unknown='ignore',
+    otherwise the call fails with InvalidArgumentError naming the column.
+    """
+
+    def __init__(self, keras_model, numeric_params, embedder_url, model_fingerprint=''):
+        super().__init__()
+        p = numeric_params
+        self.model = keras_model
+        self.encoder = _load_hub_model(embedder_url)
+        # model_fingerprint() of the Keras files exported, matched against calibration tables at load
+        self.model_fingerprint = tf.Variable(model_fingerprint, dtype=tf.string, trainable=False)
+        self.num_cols = tf.Variable(p['num_cols'], dtype=tf.string, trainable=False)
+        self.cat_cols = tf.Variable(p['cat_cols'], dtype=tf.string, trainable=False)
+        self._cat_col_names = list(p['cat_cols'])
+
+        # Yeo-Johnson on large lambdas overflows float32, so the numeric path runs in float64
+        self._median = tf.constant(p['median'], tf.float64)
+        self._lambdas = tf.constant(p['lambdas'], tf.float64)
+        self._power_mean = tf.constant(p['power_mean'], tf.float64)
+        self._power_scale = tf.constant(p['power_scale'], tf.float64)
+        self._scaler_mean = tf.constant(p['scaler_mean'], tf.float64)
+        self._scaler_scale = tf.constant(p['scaler_scale'], tf.float64)
+        self._modes = [tf.constant(m) for m in p['modes']]
+        self._categories = [tf.constant(c) for c in p['categories']]
+        self._ignore_unknown = p.get('handle_unknown', 'error') == 'ignore'
+
+        self.serve = tf.function(self._serve, input_signature=[
+            tf.TensorSpec([None, len(p['num_cols'])], tf.float32, name='num'),
+            tf.TensorSpec([None, len(p['cat_cols'])], tf.string, name='cat'),
+            tf.TensorSpec([None], tf.string, name='cc'),
+        ])
+
+    def _numeric(self, num):
+        x = tf.cast(num, tf.float64)
+        x = tf.where(tf.math.is_nan(x), self._median, x)
+
+        # Same branches as sklearn's PowerTransformer._yeo_johnson_transform
+        lam = self._lambdas
+        eps = np.spacing(1.0)
+        pos = tf.where(tf.abs(lam) < eps, tf.math.log1p(tf.maximum(x, 0.0)),
+                       (tf.pow(tf.maximum(x, 0.0) + 1.0, lam) - 1.0) / lam)
+        neg = tf.where(tf.abs(lam - 2.0) < eps, -tf.math.log1p(tf.maximum(-x, 0.0)),
+                       -(tf.pow(tf.maximum(-x, 0.0) + 1.0, 2.0 - lam) - 1.0) / (2.0 - lam))
+        y = tf.where(x >= 0, pos, neg)
+
+        y = (y - self._power_mean) / self._power_scale
+        y = (y - self._scaler_mean) / self._scaler_scale
+        return tf.cast(y, tf.float32)
+
+    def _categorical(self, cat):
+        encoded = []
+        for j, (mode, categories) in enumerate(zip(self._modes, self._categories)):
+            col = cat[:, j:j + 1]
+            col = tf.where(tf.equal(col, ''), mode, col)
+            match = tf.equal(col, categories[tf.newaxis, :])
+            if not self._ignore_unknown:
+                # Same contract as OneHotEncoder(handle_unknown='error') and CompiledNumericPreprocessor
+                check = tf.debugging.assert_equal(
+                    tf.reduce_any(match, axis=1), True,
+                    message=f"Found unknown category in column '{self._cat_col_names[j]}' during transform")
+                with tf.control_dependencies([check]):
+                    match = tf.identity(match)
+            encoded.append(tf.cast(match, tf.float32))
+        return encoded
+
+    def _serve(self, num, cat, cc):
+        num_features = tf.concat([self._numeric(num)] + self._categorical(cat), axis=1)
+        text_features = tf.cast(self.encoder(cc), tf.float32)
+        return {'probabilities': self.model([num_features, text_features], training=False)}
+
+
 # Custom transformer for text embedding
 class TextEmbedder(BaseEstimator, TransformerMixin):
-    def __init__(self, embedder_url):
+    def __init__(self, embedder_url, batch_size=256, verbose=True, cache=None):
         assert embedder_url is not None, "embedder_url must be set"
+        assert batch_size > 0, "batch_size must be positive"
         self.embedder_url = embedder_url
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.cache = cache
         self.embedder = None
-        self._load_model()
 
     def _load_model(self):
+        # Deferred until the first cache miss so constructing the preprocessor never downloads the encoder
         if self.embedder is None:
-            self.embedder = hub.load(self.embedder_url)
+            self.embedder = _load_hub_model(self.embedder_url)
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, X):
-        embeddings = []
-        for text in X:
-            embeddings.append(self.embedder(str(text)))
-        return np.array(embeddings)
+        # Flatten (n, 1) column output from the text ColumnTransformer into n strings
+        texts = [str(text) for text in np.asarray(X, dtype=object).reshape(-1)]
+        if self.cache is not None:
+            # Only complaints missing from the shared EmbeddingCache reach the encoder
+            return self.cache.embed(texts, self._embed_batched)
+        return self._embed_batched(texts)
+
+    def _embed_batched(self, texts):
+        n = len(texts)
+        embeddings = None
+        if n:
+            # Loaded here rather than in transform, so batches fully served by the cache never touch TF-Hub
+            self._load_model()
+        start_time = time.perf_counter()
+
+        # Send fixed-size chunks to the encoder and fill a preallocated (n, dim) float32 array
+        for start in range(0, n, self.batch_size):
+            end = min(start + self.batch_size, n)
+            chunk = np.asarray(self.embedder(texts[start:end]), dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((n, chunk.shape[-1]), dtype=np.float32)
+            embeddings[start:end] = chunk
+
+            if self.verbose:
+                elapsed = time.perf_counter() - start_time
+                print(f"\rEmbedded {end}/{n} texts ({end / max(elapsed, 1e-9):.0f} texts/s)", end='' if end < n else '\n')
+
+        if embeddings is None:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        return embeddings
 
 
 class DataPreprocessing:
@@ -218,6 +510,7 @@ class DataPreprocessing:
         # self.text_embedder_path = '/Users/patipansittiprawiat/.cache/kagglehub/model/google/universal-sentence-encoder/tensorFlow2/multilingual-large/2'
         # self.text_embedder_path = 'https://tfhub.dev/google/universal-sentence-encoder-multilingual/3'
         # self.text_embedder = TextEmbedder(self.text_embedder_path)
+        self.text_embedder = None
 
     def import_data(self, data, x_num_cols, x_text_cols, y_cols):
         train, val, test = data
@@ -268,22 +561,147 @@ class DataPreprocessing:
         # Transform new data using the already-fitted transformers
         num_features_processed = self.num_preprocessor.transform(data[self.x_num_cols])
         text_features_processed = self.text_preprocessor.transform(data[self.x_text_cols])
-        text_features_processed = self.text_embedder.transform(text_features_processed)[:, 0, :]
-        print(text_features_processed.shape)
+        text_features_processed = self.text_embedder.transform(text_features_processed)
         return num_features_processed, text_features_processed
 
-    def convert_to_dataset(self, data, batch_size=32, prefetch=tf.data.AUTOTUNE):
+    def convert_to_dataset(self, data, batch_size=32, prefetch=tf.data.AUTOTUNE, chunksize=None, feature_store=None):
+        # Precomputed features are sliced straight out of the memory-mapped store
+        if feature_store is not None and isinstance(data, pd.DataFrame):
+            return self._memmap_dataset(self.cached_features(data, feature_store), batch_size, prefetch)
+        # Files / shard lists, or an explicit chunksize, go through the bounded-memory streaming path
+        if chunksize is not None or not isinstance(data, pd.DataFrame):
+            return self.stream_dataset(data, batch_size=batch_size, chunksize=chunksize or 10_000, prefetch=prefetch)
         num_features_processed, text_features_processed = self.transform(data)
         targets = data[self.y_cols]
         dataset = tf.data.Dataset.from_tensor_slices(({'num': num_features_processed, 'text': text_features_processed}, targets)).batch(batch_size).prefetch(prefetch)
         return dataset
 
-    def _process(self):
+    def parallel_embedding(self, embedder_url=None, n_workers=None, intra_op_threads=None, **kwargs):
+        """Replace text_embedder with a multi-process ParallelEmbedder for large corpora; call close() on it when done."""
+        from src.parallel_embedding import ParallelEmbedder
+        current = self.text_embedder
+        embedder_url = embedder_url or getattr(current, 'embedder_url', None)
+        kwargs.setdefault('cache', getattr(current, 'cache', None))
+        self.text_embedder = ParallelEmbedder(embedder_url, n_workers=n_workers, intra_op_threads=intra_op_threads, **kwargs)
+        return self.text_embedder
+
+    def fingerprint(self, data):
+        """Feature-store key of data under the fitted num_preprocessor and the current encoder."""
+        assert self.num_preprocessor is not None, "need to call method 'fit()' or load num_preprocessor first"
+        assert self.text_embedder is not None, "need to set 'text_embedder' first"
+        return fingerprint(data[self.x_num_cols + self.x_text_cols + self.y_cols], self.num_preprocessor,
+                           self.text_embedder.embedder_url)
+
+    def cached_features(self, data, feature_store):
+        """Memory-mapped num / text / targets for data, transformed and embedded only on the first run."""
+        def compute():
+            num, text = self.transform(data)
+            return num, text, data[self.y_cols].to_numpy(dtype=np.float32)
+        return feature_store.get_or_compute(self.fingerprint(data), compute, meta={'rows': len(data), 'y_cols': self.y_cols})
+
+    def _memmap_dataset(self, arrays, batch_size, prefetch):
+        num, text, targets = arrays['num'], arrays['text'], arrays['targets']
+        signature = (
+            {'num': tf.TensorSpec((None, num.shape[1]), tf.float32), 'text': tf.TensorSpec((None, text.shape[1]), tf.float32)},
+            tf.TensorSpec((None, targets.shape[1]), tf.float32),
+        )
+
+        def generator():
+            # Batch-sized views of the memmaps; pages are read only when the batch is consumed
+            for start in range(0, len(targets), batch_size):
+                end = start + batch_size
+                yield {'num': num[start:end], 'text': text[start:end]}, targets[start:end]
+
+        return tf.data.Dataset.from_generator(generator, output_signature=signature).prefetch(prefetch)
+
+    def _resolve_shards(self, source):
+        # DataFrame -> [df]; directory -> its *.parquet / *.csv files; glob pattern -> matches; list -> as is
+        if isinstance(source, pd.DataFrame):
+            return [source]
+        if isinstance(source, (list, tuple)):
+            return [str(s) for s in source]
+        source = str(source)
+        if os.path.isdir(source):
+            shards = sorted(glob.glob(os.path.join(source, '*.parquet')) + glob.glob(os.path.join(source, '*.csv')))
+        else:
+            shards = sorted(glob.glob(source)) if any(c in source for c in '*?[') else [source]
+        assert shards, f"no CSV or Parquet shards found for {source}"
+        return shards
+
+    def _iter_chunks(self, source, chunksize):
+        if isinstance(source, pd.DataFrame):
+            for start in range(0, len(source), chunksize):
+                yield source.iloc[start:start + chunksize]
+            return
+        path = source.decode('utf-8') if isinstance(source, bytes) else str(source)
+        columns = self.x_num_cols + self.x_text_cols + self.y_cols
+        if path.endswith(('.parquet', '.pq')):
+            parquet = _lazy_import('pyarrow.parquet')
+            for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+    def stream_dataset(self, source, batch_size=32, chunksize=10_000, shuffle_buffer=None, cycle_length=None,
+                       prefetch=tf.data.AUTOTUNE, text_dim=None):
+        """tf.data pipeline that reads, transforms and embeds source chunk by chunk.
+
+        source is a DataFrame, a CSV / Parquet file, a directory or glob of shards, or a list of shard
+        paths; several shards are interleaved. Peak memory is about cycle_length chunks plus buffers.
+        """
+        assert self.num_preprocessor is not None, "need to call method 'fit()' or load num_preprocessor first"
+        assert self.text_embedder is not None, "need to set 'text_embedder' first"
+
+        num_dim = len(self.num_preprocessor.get_feature_names_out())
+        if text_dim is None:
+            text_dim = self.text_embedder.transform(np.array([[' ']], dtype=object)).shape[1]
+        signature = (
+            {'num': tf.TensorSpec((None, num_dim), tf.float32), 'text': tf.TensorSpec((None, text_dim), tf.float32)},
+            tf.TensorSpec((None, len(self.y_cols)), tf.float32),
+        )
+
+        def generator(shard):
+            for chunk in self._iter_chunks(shard, chunksize):
+                num, text = self.transform(chunk)
+                yield ({'num': np.asarray(num, dtype=np.float32), 'text': np.asarray(text, dtype=np.float32)},
+                       chunk[self.y_cols].to_numpy(dtype=np.float32))
+
+        shards = self._resolve_shards(source)
+        if len(shards) == 1:
+            dataset = tf.data.Dataset.from_generator(lambda: generator(shards[0]), output_signature=signature)
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices(shards).interleave(
+                lambda shard: tf.data.Dataset.from_generator(generator, output_signature=signature, args=(shard,)),
+                cycle_length=cycle_length or min(len(shards), 4),
+                num_parallel_calls=tf.data.AUTOTUNE,
+                deterministic=shuffle_buffer is None)
+
+        # Generators yield whole chunks; re-slice them into training batches
+        dataset = dataset.unbatch()
+        if shuffle_buffer:
+            dataset = dataset.shuffle(shuffle_buffer)
+        return dataset.batch(batch_size).prefetch(prefetch)
+
+    def numeric_params(self):
+        """Fitted imputer / Yeo-Johnson / scaler / one-hot parameters of num_preprocessor as plain arrays."""
+        assert self.num_preprocessor is not None, "need to call method 'fit()' or load num_preprocessor first"
+        return extract_numeric_params(self.num_preprocessor)
+
+    def compile_numeric(self, verify=True):
+        """Pure-NumPy equivalent of num_preprocessor, checked against sklearn on synthetic rows."""
+        compiled = CompiledNumericPreprocessor(self.numeric_params())
+        if verify:
+            compiled.verify(self.num_preprocessor)
+        return compiled
+
+    def _process(self, chunksize=None, feature_store=None):
         # Fit transformers on the training data
         self.fit(self.train, self.x_num_cols, self.x_text_cols, self.y_cols)
 
-        train_dataset = self.convert_to_dataset(self.train)
-        val_dataset = self.convert_to_dataset(self.val)
-        test_dataset = self.convert_to_dataset(self.test)
+        # With chunksize set, each split is transformed and embedded lazily while training iterates;
+        # with a FeatureStore, re-runs on unchanged data and preprocessing skip both steps
+        train_dataset = self.convert_to_dataset(self.train, chunksize=chunksize, feature_store=feature_store)
+        val_dataset = self.convert_to_dataset(self.val, chunksize=chunksize, feature_store=feature_store)
+        test_dataset = self.convert_to_dataset(self.test, chunksize=chunksize, feature_store=feature_store)
 
         return train_dataset, val_dataset, test_dataset
\ No newline at end of file
@@ -0,0 +1,107 @@
+# Triage rules shared by the Streamlit apps and the HTTP service
+# ---------------------------------------------------
+# Model outcomes are grouped into critical / urgent / minor resource risks and
+# compared against the protocol cutoffs; vital-sign red-flags override to Level 1.
+
+import numpy as np
+
+TARGETS = [
+    "icu_admission", "or", "7_day_death", "admission", "lab",
+    "xray", "et", "inject", "consult"
+]
+
+NUM_COLS = ['age','sbp','dbp','temp','pr','rr','o2sat','gcs_e','gcs_v','gcs_m','sex','how_come_er','t_n']
+TEXT_COLS = ['cc']
+VITAL_COLS = ['sbp','o2sat','rr','temp','gcs_e','gcs_v','gcs_m']
+
+CRITICAL_TARGETS = ['7_day_death', 'icu_admission', 'et', 'or']
+URGENT_TARGETS = ['admission', 'inject', 'consult']
+MINOR_TARGETS = ['lab', 'xray']
+
+DEFAULT_CUTOFFS = {'lvl1': 0.50, 'lvl2': 0.30, 'lvl3': 0.40, 'lvl4': 0.25}
+DEFAULT_RED_FLAGS = {'sbp': 90, 'o2sat': 90, 'rr': 30, 'temp': 39.5, 'gcs': 8}
+
+
+def vital_red_flags(v: dict, thresholds: dict = DEFAULT_RED_FLAGS) -> list[str]:
+    flags = []
+    if v.get('sbp', 999) < thresholds['sbp']: flags.append(f"SBP < {thresholds['sbp']}")
+    if v.get('o2sat', 100) < thresholds['o2sat']: flags.append(f"SpO₂ < {thresholds['o2sat']}%")
+    if v.get('rr', 0) > thresholds['rr']: flags.append(f"RR > {thresholds['rr']}")
+    if v.get('temp', 0) >= thresholds['temp']: flags.append(f"Temp ≥ {thresholds['temp']}°C")
+    gcs_total = v.get('gcs_e', 4) + v.get('gcs_v', 5) + v.get('gcs_m', 6)
+    if gcs_total <= thresholds['gcs']: flags.append(f"GCS ≤ {thresholds['gcs']}")
+    return flags
+
+
+def triage_level(preds: dict, vitals: dict, cutoffs: dict = DEFAULT_CUTOFFS,
+                 red_flags: dict = DEFAULT_RED_FLAGS, apply_redflags: bool = True) -> tuple[int, str, float, list[str]]:
+    """Return (level, reason, score, flags); reason is 'red_flags', 'critical', 'urgent', 'minor' or 'below_cutoffs'."""
+    critical = max(preds.get(t, 0) for t in CRITICAL_TARGETS)
+    urgent = max(preds.get(t, 0) for t in URGENT_TARGETS)
+    minor = max(preds.get(t, 0) for t in MINOR_TARGETS)
+
+    if apply_redflags:
+        flags = vital_red_flags(vitals, red_flags)
+        if flags:
+            return 1, 'red_flags', critical, flags
+
+    if critical >= cutoffs['lvl1']:
+        return 1, 'critical', critical, []
+    if critical >= cutoffs['lvl2']:
+        return 2, 'critical', critical, []
+    if urgent >= cutoffs['lvl3']:
+        return 3, 'urgent', urgent, []
+    if minor >= cutoffs['lvl4']:
+        return 4, 'minor', minor, []
+    return 5, 'below_cutoffs', max(critical, urgent, minor), []
+
+
+# Vectorized versions for whole columns of logged predictions (cutoff simulator, batch triage)
+# Missing vitals never raise a red flag, as NaN comparisons are False in the scalar rules too.
+RED_FLAG_DEFAULTS = {'sbp': 999, 'o2sat': 100, 'rr': 0, 'temp': 0, 'gcs_e': 4, 'gcs_v': 5, 'gcs_m': 6}
+REASONS = np.array(['red_flags', 'critical', 'urgent', 'minor', 'below_cutoffs'])
+
+
+def _length(data) -> int:
+    if isinstance(data, dict):
+        return len(next(iter(data.values()))) if data else 0
+    return len(data)
+
+
+def _column(data, name, n, default=np.nan):
+    if name in data:
+        return np.asarray(data[name], dtype=np.float64).reshape(-1)
+    return np.full(n, default, dtype=np.float64)
+
+
+def risk_groups(preds) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(critical, urgent, minor) maxima for preds as a DataFrame / dict of columns or an [n, len(TARGETS)] array."""
+    if isinstance(preds, np.ndarray):
+        preds = {t: preds[:, i] for i, t in enumerate(TARGETS)}
+    n = _length(preds)
+    group = lambda targets: np.max(np.column_stack([_column(preds, t, n, 0.0) for t in targets]), axis=1)
+    return group(CRITICAL_TARGETS), group(URGENT_TARGETS), group(MINOR_TARGETS)
+
+
+def vital_red_flags_mask(vitals, thresholds: dict = DEFAULT_RED_FLAGS) -> np.ndarray:
+    """Boolean array: any vital_red_flags() rule fires, for vitals as a DataFrame / dict of columns."""
+    n = _length(vitals)
+    v = {c: _column(vitals, c, n, d) for c, d in RED_FLAG_DEFAULTS.items()}
+    with np.errstate(invalid='ignore'):
+        return ((v['sbp'] < thresholds['sbp']) | (v['o2sat'] < thresholds['o2sat']) | (v['rr'] > thresholds['rr'])
+                | (v['temp'] >= thresholds['temp']) | (v['gcs_e'] + v['gcs_v'] + v['gcs_m'] <= thresholds['gcs']))
+
+
+def triage_levels(preds, vitals, cutoffs: dict = DEFAULT_CUTOFFS, red_flags: dict = DEFAULT_RED_FLAGS,
+                  apply_redflags: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Array version of triage_level over n patients: (levels int8, reasons str, scores float)."""
+    critical, urgent, minor = risk_groups(preds)
+    flagged = vital_red_flags_mask(vitals, red_flags) if apply_redflags else np.zeros(len(critical), dtype=bool)
+
+    conditions = [flagged, critical >= cutoffs['lvl1'], critical >= cutoffs['lvl2'],
+                  urgent >= cutoffs['lvl3'], minor >= cutoffs['lvl4']]
+    levels = np.select(conditions, [1, 1, 2, 3, 4], default=5).astype(np.int8)
+    reason_idx = np.select(conditions, [0, 1, 1, 2, 3], default=4)
+    scores = np.select(conditions, [critical, critical, critical, urgent, minor],
+                       default=np.maximum.reduce([critical, urgent, minor]))
+    return levels, REASONS[reason_idx], scores
@@ -0,0 +1,171 @@
+# Parallel, latency-aware hyperparameter search for TriageModel
+# ---------------------------------------------------
+# Random search over the create_model() knobs in TriageModel.parameters. Train
+# and validation features are written once to the memory-mapped FeatureStore
+# and every trial process reads them from there. Each trial records validation
+# PRC/AUC, single-row predict_fast latency and model size; the Pareto set trades
+# accuracy against speed and size. Used by TriageModel.hyperparameter_tuning.
+
+import hashlib
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from src.feature_store import FeatureStore
+
+
+DEFAULT_SEARCH_SPACE = {
+    'learning_rate': [3e-4, 6e-4, 0.0012, 0.0025, 0.005],
+    'dropout_rate': [0.0, 0.1, 0.2, 0.3],
+    'num_hidden_layers_text': [0, 1, 2],
+    'num_neurons_text': [32, 64, 128, 256],
+    'num_hidden_layers_num': [0, 1, 2],
+    'num_neurons_num': [16, 32, 64, 128],
+    'num_hidden_layers_concat': [1, 2, 3],
+    'num_neurons_concat': [16, 32, 64],
+}
+DEFAULT_CACHE_DIR = os.path.join("cache", "tuning")
+
+
+def sample_parameters(search_space: dict, n_trials: int, base: dict = None, seed: int = 0) -> list[dict]:
+    """n_trials distinct random configurations; keys missing from search_space keep their base value."""
+    rng = np.random.default_rng(seed)
+    seen, trials = set(), []
+    max_distinct = int(np.prod([len(v) for v in search_space.values()]))
+    while len(trials) < min(n_trials, max_distinct):
+        params = {**(base or {}), **{k: v[rng.integers(len(v))] for k, v in search_space.items()}}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            trials.append({k: (v.item() if isinstance(v, np.generic) else v) for k, v in params.items()})
+    return trials
+
+
+def pareto_front(results: pd.DataFrame, maximize=('val_prc',), minimize=('latency_p50_ms', 'params')) -> np.ndarray:
+    """Boolean mask of rows not dominated on every objective by some other row."""
+    values = np.column_stack([-results[c].to_numpy(float) for c in maximize] + [results[c].to_numpy(float) for c in minimize])
+    return np.array([not (np.all(values <= v, axis=1) & np.any(values < v, axis=1)).any() for v in values], dtype=bool)
+
+
+def dataset_arrays(dataset) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate a ({'num', 'text'}, targets) tf.data dataset into float32 arrays."""
+    num, text, targets = [], [], []
+    for features, y in dataset.as_numpy_iterator():
+        num.append(features['num'])
+        text.append(features['text'])
+        targets.append(y)
+    return tuple(np.concatenate(parts).astype(np.float32) for parts in (num, text, targets))
+
+
+def cache_dataset(dataset, store: FeatureStore) -> str:
+    """Write a dataset's arrays to the feature store under a hash of their contents; returns the key."""
+    arrays = dataset_arrays(dataset)
+    digest = hashlib.sha256(b"tuning|")
+    for array in arrays:
+        digest.update(str(array.shape).encode("utf-8"))
+        digest.update(array.tobytes())
+    key = digest.hexdigest()
+    if not store.has(key):
+        store.save(key, *arrays, meta={'rows': len(arrays[2])})
+    return key
+
+
+def _init_worker(intra_op_threads):
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_trial(trial_id, parameters, store_dir, train_key, val_key, epochs, batch_size, patience, latency_repeats) -> dict:
+    import tensorflow as tf
+    from src.source import TriageModel
+
+    store = FeatureStore(store_dir)
+
+    def to_dataset(key, shuffle):
+        # Batches are read from the memmaps as they are consumed (like DataPreprocessing._memmap_dataset),
+        # so parallel trials share the OS page cache instead of each holding a copy of the features
+        arrays = store.load(key)
+        num, text, targets = arrays['num'], arrays['text'], arrays['targets']
+        signature = (
+            {'num': tf.TensorSpec((None, num.shape[1]), tf.float32), 'text': tf.TensorSpec((None, text.shape[1]), tf.float32)},
+            tf.TensorSpec((None, targets.shape[1]), tf.float32),
+        )
+        rng = np.random.default_rng(trial_id)
+
+        def generator():
+            # A new row order every epoch; rows within a batch are read in file order
+            order = rng.permutation(len(targets)) if shuffle else None
+            for start in range(0, len(targets), batch_size):
+                if order is None:
+                    rows = slice(start, start + batch_size)
+                else:
+                    rows = np.sort(order[start:start + batch_size])
+                yield {'num': num[rows], 'text': text[rows]}, targets[rows]
+
+        return tf.data.Dataset.from_generator(generator, output_signature=signature).prefetch(tf.data.AUTOTUNE)
+
+    train_dataset, val_dataset = to_dataset(train_key, True), to_dataset(val_key, False)
+    model = TriageModel()
+    model.set_parameters(parameters)
+    model.import_data(train_dataset, val_dataset, val_dataset)
+    model.create_model()
+
+    start = time.perf_counter()
+    early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True)
+    history = model.model.fit(train_dataset, validation_data=val_dataset, epochs=epochs, callbacks=[early_stopping], verbose=0)
+    train_seconds = time.perf_counter() - start
+    scores = model.model.evaluate(val_dataset, return_dict=True, verbose=0)
+
+    # Single-row latency of the traced serving path, as seen at the front door
+    val = store.load(val_key)
+    num_row, text_row = np.asarray(val['num'][:1]), np.asarray(val['text'][:1])
+    model.predict_fast(num_row, text_row)
+    timings = []
+    for _ in range(latency_repeats):
+        start = time.perf_counter()
+        model.predict_fast(num_row, text_row)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'trial': trial_id,
+        **parameters,
+        **{f'val_{k}': float(v) for k, v in scores.items()},
+        'latency_p50_ms': float(np.percentile(timings, 50)),
+        'latency_p95_ms': float(np.percentile(timings, 95)),
+        'params': int(model.model.count_params()),
+        'size_kb': sum(w.nbytes for w in model.model.get_weights()) / 1024,
+        'epochs_run': len(history.history['loss']),
+        'train_seconds': train_seconds,
+    }
+
+
+def tune(train_dataset, val_dataset, base_parameters: dict, search_space: dict = None, n_trials=20, n_workers=None,
+         epochs=30, batch_size=32, patience=5, latency_repeats=50, cache_dir=DEFAULT_CACHE_DIR, seed=0) -> pd.DataFrame:
+    search_space = search_space or DEFAULT_SEARCH_SPACE
+    store = FeatureStore(os.path.join(cache_dir, "features"))
+    train_key, val_key = cache_dataset(train_dataset, store), cache_dataset(val_dataset, store)
+    trials = sample_parameters(search_space, n_trials, base=base_parameters, seed=seed)
+
+    cores = os.cpu_count() or 1
+    n_workers = n_workers or max(1, min(len(trials), cores // 2))
+    results = []
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context('spawn'),
+                             initializer=_init_worker, initargs=(max(1, cores // n_workers),)) as pool:
+        futures = [pool.submit(run_trial, i, params, store.root, train_key, val_key, epochs, batch_size, patience, latency_repeats)
+                   for i, params in enumerate(trials)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"Trial {result['trial']:>3}: val_prc={result['val_prc']:.4f} val_auc={result['val_auc']:.4f} "
+                  f"p50={result['latency_p50_ms']:.2f}ms params={result['params']} ({len(results)}/{len(trials)})")
+
+    results = pd.DataFrame(results).sort_values('trial').reset_index(drop=True)
+    results['pareto'] = pareto_front(results)
+    os.makedirs(cache_dir, exist_ok=True)
+    results.to_csv(os.path.join(cache_dir, "results.csv"), index=False)
+    return results
@@ -0,0 +1,240 @@
+# Lean predictor for the calibrated XGBoost ICU model
+# ---------------------------------------------------
+# Exports model/xgb_model_calibrated.pkl (sklearn Pipeline: ColumnTransformer
+# with num / cat / text-PCA blocks -> CalibratedClassifierCV(XGBClassifier))
+# into plain arrays plus raw booster bytes:
+#   - vitals / categories: CompiledNumericPreprocessor parameters
+#   - text: PCA mean, components and whitening scale
+#   - per calibration fold: the booster and its calibrator as a MonotoneLookup
+# LeanXGBPredictor scores one patient with NumPy, Booster.inplace_predict on a
+# dense float32 row and np.interp, without sklearn validation or DataFrames.
+# The export is only written when it reproduces the pickled pipeline.
+#
+#   python -m src.xgb_export --model model/xgb_model_calibrated.pkl --output model/xgb_lean.joblib
+#   python -m src.xgb_export --verify-only --data data/test.csv
+
+import argparse
+import pickle
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.calibration import MonotoneLookup
+from src.direct_features import UnsupportedPipeline, _locate_column_transformer
+from src.numeric_preprocessor import CompiledNumericPreprocessor, extract_numeric_params
+from src.triage import NUM_COLS
+
+
+DEFAULT_MODEL_PATH = "model/xgb_model_calibrated.pkl"
+DEFAULT_LEAN_PATH = "model/xgb_lean.joblib"
+EMBEDDING_COLS = [f'text_{i}' for i in range(512)]
+FORMAT_VERSION = 1
+
+
+class LeanModelError(ValueError):
+    """The lean export cannot be used: unknown format, or predictions differ from the pickled pipeline."""
+
+
+def _pca_params(transformer) -> dict:
+    """Mean / components / whitening scale of the text block (a PCA or a Pipeline holding only one)."""
+    from sklearn.decomposition import PCA
+    from sklearn.pipeline import Pipeline
+
+    steps = [est for _, est in transformer.steps if est not in (None, 'passthrough')] \
+        if isinstance(transformer, Pipeline) else [transformer]
+    if len(steps) != 1 or not isinstance(steps[0], PCA):
+        raise UnsupportedPipeline(f"text block must be a single PCA, got {[type(s).__name__ for s in steps]}")
+    pca = steps[0]
+    scale = None
+    if pca.whiten:
+        # Same variance clipping as sklearn's _BasePCA._transform
+        scale = np.sqrt(pca.explained_variance_)
+        scale[scale < np.finfo(scale.dtype).eps] = np.finfo(scale.dtype).eps
+    return {'mean': pca.mean_, 'components': pca.components_, 'scale': scale}
+
+
+def _booster_spec(clf) -> dict:
+    """Raw booster bytes and the predict settings XGBClassifier.predict_proba would use."""
+    if not hasattr(clf, 'get_booster'):
+        raise UnsupportedPipeline(f"expected an XGBClassifier, got {type(clf).__name__}")
+    if getattr(clf, 'n_classes_', 2) != 2:
+        raise UnsupportedPipeline("only binary classifiers are supported")
+    # best_iteration only exists when early stopping ran; XGBModel._get_iteration_range uses it then
+    try:
+        best = clf.best_iteration
+    except AttributeError:
+        best = None
+    return {
+        'raw': bytes(clf.get_booster().save_raw('ubj')),
+        'iteration_range': (0, best + 1) if best is not None else (0, 0),
+        'missing': float(clf.missing) if clf.missing is not None else np.nan,
+    }
+
+
+def export_spec(model, input_cols=NUM_COLS, embedding_cols=EMBEDDING_COLS) -> dict:
+    """Everything LeanXGBPredictor needs, as plain arrays / bytes; raises UnsupportedPipeline otherwise."""
+    ct, post_steps, estimator = _locate_column_transformer(model)
+    if post_steps:
+        raise UnsupportedPipeline(f"steps between preprocessing and the classifier: {[type(s).__name__ for s in post_steps]}")
+    if getattr(ct, 'sparse_output_', False):
+        raise UnsupportedPipeline("ColumnTransformer produces sparse output")
+
+    blocks = [name for name, transformer, _ in ct.transformers_
+              if transformer != 'drop' and len(ct._transformer_to_input_indices.get(name, []))]
+    if blocks != ['num', 'cat', 'text']:
+        raise UnsupportedPipeline(f"expected ColumnTransformer blocks num, cat, text in that order, got {blocks}")
+    text_transformer = ct.named_transformers_['text']
+    text_cols = [ct.feature_names_in_[i] for i in ct._transformer_to_input_indices['text']]
+
+    # Calibration folds: each averages its own booster through its own calibrator
+    if hasattr(estimator, 'calibrated_classifiers_'):
+        folds = [(cc.estimator, MonotoneLookup.from_calibrator(cc.calibrators[0])) for cc in estimator.calibrated_classifiers_]
+    else:
+        folds = [(estimator, MonotoneLookup.identity())]
+
+    numeric = extract_numeric_params(ct)
+    for col in numeric['num_cols'] + numeric['cat_cols']:
+        if col not in input_cols:
+            raise UnsupportedPipeline(f"pipeline column {col!r} is not one of the inputs")
+    return {
+        'format_version': FORMAT_VERSION,
+        'input_cols': list(input_cols),
+        'embedding_positions': [list(embedding_cols).index(c) for c in text_cols],
+        'numeric': numeric,
+        'pca': _pca_params(text_transformer),
+        'boosters': [_booster_spec(clf) for clf, _ in folds],
+        'calibrators': [lookup.to_dict() for _, lookup in folds],
+    }
+
+
+class LeanXGBPredictor:
+    def __init__(self, spec: dict):
+        import xgboost as xgb
+
+        if spec.get('format_version') != FORMAT_VERSION:
+            raise LeanModelError(f"unsupported lean model format {spec.get('format_version')!r} (expected {FORMAT_VERSION})")
+        self.spec = spec
+        self.input_cols = list(spec['input_cols'])
+        self.numeric = CompiledNumericPreprocessor(spec['numeric'])
+        self._num_idx = [self.input_cols.index(c) for c in self.numeric.num_cols]
+        self._cat_idx = [self.input_cols.index(c) for c in self.numeric.cat_cols]
+        self._embedding_positions = np.asarray(spec['embedding_positions'], dtype=np.intp)
+
+        pca = spec['pca']
+        self._components_t = np.ascontiguousarray(pca['components'].T)
+        self._mean_projection = pca['mean'] @ pca['components'].T
+        self._scale = pca['scale']
+        self.n_features = self.numeric.n_features_out + self._components_t.shape[1]
+
+        self.boosters = []
+        for b in spec['boosters']:
+            booster = xgb.Booster()
+            booster.load_model(bytearray(b['raw']))
+            self.boosters.append((booster, tuple(b['iteration_range']), b['missing']))
+        self.calibrators = [MonotoneLookup.from_dict(c) for c in spec['calibrators']]
+        self._local = threading.local()
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        return cls(export_spec(model, **kwargs))
+
+    @classmethod
+    def load(cls, path=DEFAULT_LEAN_PATH):
+        return cls(joblib.load(path))
+
+    def save(self, path=DEFAULT_LEAN_PATH):
+        joblib.dump(self.spec, path)
+
+    def features(self, values, use_vec) -> np.ndarray:
+        """[1, n_features] float32 model input for one patient (values in input_cols order + embedding)."""
+        local = self._local
+        if not hasattr(local, 'row'):
+            local.row = np.zeros((1, self.n_features), dtype=np.float32)
+        row = local.row
+        num = np.array([[np.nan if values[i] is None else values[i] for i in self._num_idx]], dtype=np.float64)
+        cat = np.array([[values[i] for i in self._cat_idx]], dtype=object)
+        k = self.numeric.n_features_out
+        row[:, :k] = self.numeric.transform_arrays(num, cat)
+
+        # PCA.transform computes X @ components.T - mean @ components.T; float32 embeddings upcast like sklearn
+        x = np.asarray(use_vec).reshape(1, -1)[:, self._embedding_positions]
+        x = x.astype(np.result_type(x.dtype, self._components_t.dtype), copy=False)
+        projected = x @ self._components_t - self._mean_projection
+        row[:, k:] = projected / self._scale if self._scale is not None else projected
+        return row
+
+    def predict_proba(self, values, use_vec) -> np.ndarray:
+        """[1, 2] like the pipeline's predict_proba: calibrated booster outputs averaged over folds."""
+        X = self.features(values, use_vec)
+        p = np.zeros(1)
+        for (booster, iteration_range, missing), calibrate in zip(self.boosters, self.calibrators):
+            raw = booster.inplace_predict(X, iteration_range=iteration_range, predict_type='value', missing=missing)
+            p += calibrate(np.asarray(raw, dtype=np.float64).reshape(-1))
+        p /= len(self.boosters)
+        # Same clean-up as CalibratedClassifierCV
+        p[(1.0 < p) & (p <= 1.0 + 1e-5)] = 1.0
+        return np.column_stack([1.0 - p, p])
+
+    def verify(self, model, frame: pd.DataFrame, atol=1e-6) -> float:
+        """Max abs difference to model.predict_proba, one row at a time like app.py; LeanModelError beyond atol."""
+        embedding_cols = [c for c in frame.columns if c not in self.input_cols]
+        diffs = [0.0]
+        for i in range(len(frame)):
+            row = frame.iloc[[i]]
+            expected = model.predict_proba(row)
+            got = self.predict_proba(row[self.input_cols].iloc[0].tolist(), row[embedding_cols].to_numpy(np.float32))
+            diffs.append(float(np.max(np.abs(got - expected))))
+        diff = max(diffs)
+        if not diff <= atol:
+            raise LeanModelError(f"lean predictor differs from the pickled pipeline (max abs diff {diff:.3g})")
+        return diff
+
+
+def sample_frame(predictor: LeanXGBPredictor, n_text=8, seed=0, embedding_cols=EMBEDDING_COLS) -> pd.DataFrame:
+    """Vitals/category rows from CompiledNumericPreprocessor.sample_frame crossed with random unit embeddings."""
+    rng = np.random.default_rng(seed)
+    base = predictor.numeric.sample_frame()
+    rows = base.loc[np.resize(np.arange(len(base)), max(len(base), n_text))].reset_index(drop=True)
+    vecs = rng.normal(size=(len(rows), len(embedding_cols))).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    frame = pd.concat([rows.reindex(columns=predictor.input_cols), pd.DataFrame(vecs, columns=embedding_cols)], axis=1)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the calibrated XGBoost pipeline as a lean predictor")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--output', default=DEFAULT_LEAN_PATH)
+    parser.add_argument('--data', help="CSV/Parquet with NUM_COLS + text_0..text_511 for the parity check")
+    parser.add_argument('--rows', type=int, default=500, help="rows of --data to check")
+    parser.add_argument('--atol', type=float, default=1e-6)
+    parser.add_argument('--verify-only', action='store_true', help="check an existing --output against --model")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    try:
+        predictor = LeanXGBPredictor.load(args.output) if args.verify_only else LeanXGBPredictor.from_model(model)
+    except (LeanModelError, UnsupportedPipeline) as e:
+        raise SystemExit(str(e))
+
+    if args.data:
+        data = pd.read_parquet(args.data) if args.data.endswith('.parquet') else pd.read_csv(args.data)
+        frame = data[predictor.input_cols + EMBEDDING_COLS].head(args.rows)
+    else:
+        frame = sample_frame(predictor)
+    try:
+        diff = predictor.verify(model, frame, atol=args.atol)
+    except LeanModelError as e:
+        raise SystemExit(f"Not written: {e}" if not args.verify_only else str(e))
+    print(f"Parity OK on {len(frame)} patients (max abs diff {diff:.2e})")
+
+    if not args.verify_only:
+        predictor.save(args.output)
+        print(f"Wrote {args.output} ({len(predictor.boosters)} booster(s), {predictor.n_features} features)")
+
+
+if __name__ == '__main__':
+    main()
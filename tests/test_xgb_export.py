@@ -0,0 +1,128 @@
+# Parity of the lean and direct XGBoost predictors with the pickled pipeline
+# ---------------------------------------------------
+# Small synthetic pipelines shaped like model/xgb_model_calibrated.pkl
+# (num / cat / text-PCA ColumnTransformer -> CalibratedClassifierCV(XGBClassifier)),
+# fitted on benchmarks.synthetic patients and HashEncoder embeddings.
+#
+#   python -m pytest -q tests
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+pytest.importorskip('xgboost')
+
+from benchmarks.synthetic import HashEncoder, synthetic_patients
+from src.direct_features import direct_predictor
+from src.triage import NUM_COLS, TEXT_COLS
+from src.xgb_export import EMBEDDING_COLS, LeanModelError, LeanXGBPredictor, sample_frame
+
+
+CAT_COLS = ['sex', 'how_come_er', 't_n']
+VITAL_COLS = [c for c in NUM_COLS if c not in CAT_COLS]
+
+
+def _fit_pipeline(method, whiten, n=400, seed=0):
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.compose import ColumnTransformer
+    from sklearn.decomposition import PCA
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, PowerTransformer, StandardScaler
+    from xgboost import XGBClassifier
+
+    df = synthetic_patients(n, seed=seed)
+    vecs = HashEncoder()(df[TEXT_COLS[0]].tolist()).astype(np.float64)
+    X = pd.concat([df[NUM_COLS].reset_index(drop=True), pd.DataFrame(vecs, columns=EMBEDDING_COLS)], axis=1)
+    noise = np.random.default_rng(seed).random(n) < 0.1
+    y = (((X['sbp'] < 110) | (X['o2sat'] < 94) | (X['text_3'] > 0)).to_numpy() ^ noise).astype(int)
+
+    ct = ColumnTransformer([
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('power', PowerTransformer()),
+                          ('scaler', StandardScaler())]), VITAL_COLS),
+        ('cat', Pipeline([('imputer', SimpleImputer(strategy='most_frequent')),
+                          ('encoder', OneHotEncoder(handle_unknown='ignore'))]), CAT_COLS),
+        ('text', Pipeline([('pca', PCA(8, whiten=whiten, random_state=seed))]), EMBEDDING_COLS),
+    ])
+    model = Pipeline([
+        ('preprocessing', Pipeline([('col', ct)])),
+        ('model', CalibratedClassifierCV(XGBClassifier(n_estimators=20, max_depth=3), cv=2, method=method)),
+    ])
+    model.fit(X, y)
+    frame = X.head(40).copy()
+    frame[EMBEDDING_COLS] = frame[EMBEDDING_COLS].astype(np.float32)
+    return model, frame
+
+
+def _app_frame(values, use_vec):
+    # The one-row DataFrame app.py feeds predict_proba
+    return pd.concat([pd.DataFrame([values], columns=NUM_COLS),
+                      pd.DataFrame(use_vec.reshape(1, -1), columns=EMBEDDING_COLS)], axis=1)
+
+
+@pytest.fixture(scope='module', params=[('isotonic', False), ('isotonic', True), ('sigmoid', False), ('sigmoid', True)],
+                ids=lambda p: f"{p[0]}-{'whiten' if p[1] else 'plain'}")
+def fitted(request):
+    return _fit_pipeline(*request.param)
+
+
+def test_lean_matches_pipeline(fitted):
+    model, frame = fitted
+    lean = LeanXGBPredictor.from_model(model)
+    assert lean.verify(model, frame) <= 1e-6
+    assert lean.verify(model, sample_frame(lean)) <= 1e-6
+
+
+def test_lean_unknown_category_and_missing_vitals(fitted):
+    model, frame = fitted
+    lean = LeanXGBPredictor.from_model(model)
+    unknown = frame.head(3).copy()
+    unknown['how_come_er'] = 'Referral'
+    lean.verify(model, unknown)
+
+    # None vitals as typed into the form, not NaN from a DataFrame
+    use_vec = frame.iloc[[0]][EMBEDDING_COLS].to_numpy(np.float32)
+    values = frame.iloc[0][NUM_COLS].tolist()
+    values[NUM_COLS.index('sbp')] = None
+    values[NUM_COLS.index('o2sat')] = None
+    expected = model.predict_proba(_app_frame(values, use_vec))
+    np.testing.assert_allclose(lean.predict_proba(values, use_vec), expected, atol=1e-6)
+
+
+def test_lean_round_trip(fitted, tmp_path):
+    model, frame = fitted
+    path = str(tmp_path / 'lean.joblib')
+    LeanXGBPredictor.from_model(model).save(path)
+    assert LeanXGBPredictor.load(path).verify(model, frame.head(10)) <= 1e-6
+
+
+def test_lean_rejects_other_model_and_format(fitted):
+    model, frame = fitted
+    lean = LeanXGBPredictor.from_model(model)
+    other, _ = _fit_pipeline('isotonic', False, seed=1)
+    with pytest.raises(LeanModelError):
+        lean.verify(other, frame)
+    with pytest.raises(LeanModelError):
+        LeanXGBPredictor({**lean.spec, 'format_version': -1})
+
+
+def test_direct_predictor_matches_pipeline(fitted):
+    model, frame = fitted
+    direct = direct_predictor(model, NUM_COLS, EMBEDDING_COLS, CAT_COLS, sample=frame.head(5))
+    assert direct is not None
+    assert direct.check(frame) <= 1e-4
+
+    values = frame.iloc[1][NUM_COLS].tolist()
+    values[NUM_COLS.index('how_come_er')] = 'Referral'
+    values[NUM_COLS.index('temp')] = None
+    use_vec = frame.iloc[[1]][EMBEDDING_COLS].to_numpy(np.float32)
+    np.testing.assert_allclose(direct.predict_proba(values, use_vec), model.predict_proba(_app_frame(values, use_vec)),
+                               atol=1e-4)
+
+
+def test_direct_predictor_falls_back_on_errors(fitted):
+    model, frame = fitted
+    # A text column the pipeline never saw used to escape as KeyError
+    assert direct_predictor(model, NUM_COLS, EMBEDDING_COLS + ['text_512'], CAT_COLS, sample=frame.head(2)) is None
+    assert direct_predictor(object(), NUM_COLS, EMBEDDING_COLS, CAT_COLS) is None